@@ -5,7 +5,8 @@ import warnings
 from sys import maxsize
 import json
 
-from simulator.main import Simulator
+from simulator.parallel import ParallelSimulator
+from simulator.search import AttackSearch, Deployment, opponent_attacks
 
 """
 Most of the algo code you write will be in this file unless you create new
@@ -21,8 +22,13 @@ Advanced strategy tips:
 """
 
 class AlgoStrategy(gamelib.AlgoCore):
-    def __init__(self):
+    def __init__(self, simulator_processes=None):
+        """
+        simulator_processes is the number of simulation worker processes, one per CPU by default
+        """
         super().__init__()
+        self.simulator_processes = simulator_processes
+        self.simulator = None
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
@@ -42,9 +48,22 @@ class AlgoStrategy(gamelib.AlgoCore):
         INTERCEPTOR = config["unitInformation"][5]["shorthand"]
         MP = 1
         SP = 0
+        gamelib.geometry.precompute_ranges(config)
+        gamelib.unit.unit_templates(config)
+        # only breaches are read out of action frames, see on_action_fields
+        self.frame_reader.subscribe("events.breach")
         # This is a good place to do initial setup
         self.scored_on_locations = []
-        self.last_action_frame = ""
+        # start the simulation workers now so no turn pays for it
+        self.simulator = ParallelSimulator(self.simulator_processes)
+
+    def on_game_end(self):
+        """
+        Stop the simulation workers
+        """
+        if self.simulator is not None:
+            self.simulator.close()
+            self.simulator = None
 
     def on_turn(self, turn_state):
         """
@@ -56,61 +75,65 @@ class AlgoStrategy(gamelib.AlgoCore):
         """
         game_state = gamelib.GameState(self.config, turn_state)
                        
-        max_scouts = game_state.number_affordable(SCOUT)
-        # gen test to run for sim and regular game
-        test = self.generate_sim_scout_moves(max_scouts, 13, 0, SCOUT)
-        # 
-        game_state.attempt_spawn(SCOUT, [13, 0], max_scouts)
-
-        sim_result = self.simulate(test)
+        # the attack search gets half the turn, the threat search half of what's left, and building most of the rest
+        budget = game_state.budget
+
+        # simulate the most promising attacks while the attack's share of the turn lasts and send the best
+        last_action_board = self.get_last_action_board()
+        ranked = AttackSearch(game_state, self.simulator, last_action_board).run(budget.slice(0.5))
+        sim_results = []
+        if ranked:
+            ranked[0].spawn(game_state)
+            if ranked[0].result is not None:
+                sim_results = [ranked[0].result]
 
         with open("sim_results.txt", "a") as f:
-            f.write(f"ROUND: {game_state.turn_number}\n" + json.dumps(sim_result))    
+            f.write(f"ROUND: {game_state.turn_number}\n" + json.dumps(sim_results))    
 
         self.official_result(game_state.turn_number)
 
+        # the worst the opponent could do to us this turn
+        threats = opponent_attacks(game_state, self.simulator, last_action_board, budget.slice(0.5), top_k=8)
+        if threats and threats[0].score is not None:
+            gamelib.debug_write('Worst case breach: {} from {}'.format(threats[0].score, list(threats[0].groups)))
+
+        # spend our SP where it most lengthens or damages the enemy's paths, leaving time to submit the turn
+        self.optimize_defense(game_state, budget.slice(0.8))
+
         gamelib.debug_write('Performing turn {} of your custom algo strategy'.format(game_state.turn_number))
         game_state.suppress_warnings(True)  #Comment or remove this line to enable warnings.
 
        # self.starter_strategy(game_state)
         
+        gamelib.debug_write(game_state.budget)
         game_state.submit_turn()
 
     # just for testing purposes
     def official_result(self, round: int):
         with open("official_result.txt", "a") as file:
-            file.write(f"ROUND: {round}\n" + self.last_action_frame)
+            file.write(f"ROUND: {round}\n" + (self.final_action_frame or ""))
 
 
+    def optimize_defense(self, game_state, budget=None):
+        """
+        Spends our SP on the structures that best lengthen, block or damage the enemy's paths,
+        off our edges so we can still spawn there. Stops when budget (game_state.budget by default) runs out.
+        """
+        game_map = game_state.game_map
+        candidates = [location for location in game_map if location[1] < game_state.HALF_ARENA and
+                      not game_map.is_on_edge(location, game_map.BOTTOM_LEFT) and not game_map.is_on_edge(location, game_map.BOTTOM_RIGHT)]
+        with (budget or game_state.budget).measure("defense setup"):
+            optimizer = gamelib.DefenseOptimizer(game_state, candidates=candidates)
+        return optimizer.run(budget)
+
     def test_defense(self, game_state):
         game_state.attempt_spawn
 
 
     def generate_sim_scout_moves(self, count, x, y, unit_type, player_index=0):
-        p1Units = [[] for _ in range(8)]
-        p2Units = [[] for _ in range(8)]
-        if player_index == 0:
-            p1Scouts = []
-            p1Demos = []
-            for _ in range(count):
-                if unit_type == SCOUT:
-                    p1Scouts.append([x, y, 12, ""])
-                elif unit_type == DEMOLISHER:
-                    p1Demos.append([x, y, 5, ""])
-            p1Units[3] = p1Scouts
-            p1Units[4] = p1Demos
-        elif player_index == 1:
-            p2Scouts = []
-            p2Demos = []
-            for _ in range(count):
-                if unit_type == SCOUT:
-                    p2Scouts.append([x, y, 12, ""])
-                elif unit_type == DEMOLISHER:
-                    p2Demos.append([x, y, 5, ""])
-            p2Units[3] = p2Scouts
-            p2Units[4] = p2Demos
-        test = {"p1Units": p1Units, "p2Units": p2Units}
-        return test
+        """Builds a simulator test with count mobile units of unit_type at [x, y] for either player"""
+        return Deployment(((unit_type, [x, y], count),), player_index=player_index).to_test(self.config)
+
     """
     NOTE: All the methods after this point are part of the sample starter-algo
     strategy and can safely be replaced for your custom algo.
@@ -131,6 +154,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.build_defences(game_state)
         # Now build reactive defenses based on where the enemy scored
         self.build_reactive_defense(game_state)
+        # Spend the rest of our SP where it most lengthens or damages the enemy's paths
+        self.optimize_defense(game_state)
 
         # If the turn is less than 5, stall with interceptors and wait to see enemy's base
         if game_state.turn_number < 5:
@@ -237,14 +262,15 @@ class AlgoStrategy(gamelib.AlgoCore):
         estimate the path's damage risk. 
         """
         damages = []
-        # Get the damage estimate each path will take
-        for location in location_options:
-            path = game_state.find_path_to_edge(location)
-            damage = 0
-            for path_location in path:
-                # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET, game_state.config).damage_i
-            damages.append(damage)
+        threat_map = game_state.get_threat_map()
+        # Get the damage estimate each path will take, pathing every location in one pass
+        for path in game_state.paths_from_all_edges(location_options):
+            if path is None:
+                # blocked, we can't spawn here at all
+                damages.append(math.inf)
+                continue
+            # Add up the damage enemy turrets can deal on each location of the path
+            damages.append(threat_map.path_damage(path, 0))
         
         # Now just return the location that takes the least damage
         return location_options[damages.index(min(damages))]
@@ -265,18 +291,12 @@ class AlgoStrategy(gamelib.AlgoCore):
                 filtered.append(location)
         return filtered
 
-    def on_action_frame(self, turn_string):
+    def on_action_fields(self, fields):
         """
-        This is the action frame of the game. This function could be called 
-        hundreds of times per turn and could slow the algo down so avoid putting slow code here.
-        Processing the action frames is complicated so we only suggest it if you have time and experience.
-        Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
+        Called with the fields subscribed to in on_game_start, only for frames where they are not empty.
         """
-        self.last_action_frame = turn_string
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
-        breaches = events["breach"]
+        breaches = fields.get("events.breach", [])
         for breach in breaches:
             location = breach[0]
             unit_owner_self = True if breach[4] == 1 else False
@@ -295,19 +315,14 @@ class AlgoStrategy(gamelib.AlgoCore):
     #       }
     #       ... rest of tests
     #     ]
-    def simulate(self, test: json) -> json:
-        if self.last_action_frame == "":
+    def simulate(self, tests: list[json]) -> list[json]:
+        last_action_board = self.get_last_action_board()
+        if last_action_board is None:
             gamelib.debug_write("No last action frame to simulate")
-            return {}
-        
-        last_action_frame_json = json.loads(self.last_action_frame)
-        
-        for event in ["selfDestruct", "breach", "damage", "shield", "move", "spawn", "death", "attack", "melee"]:
-            last_action_frame_json[event] = []
-                
-        sim = Simulator(self.config, last_action_frame_json, test, using_pygame=True)
-        res = sim.run_simulation()        
-        
+            return []
+
+        res = self.simulator.run_batch(last_action_board, tests)
+
         # gamelib.debug_write(json.dumps(res))
         return res
 
@@ -16,6 +16,19 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to path-finding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+The ThreatMap class in threat_map.py holds the damage per frame enemy structures can deal on each location. 
+GameState.get_threat_map keeps one up to date as you build. \n
+
+The TurnBudget class in turn_budget.py tracks the time a turn has used against the engine's time limit. 
+Each GameState has one as game_state.budget, and its best_first method evaluates candidate moves until the time runs out. \n
+
+The DefenseOptimizer class in defense.py greedily spends SP on the structures that best lengthen, block or damage the enemy's paths, 
+re-pathing incrementally with the PathField class in navigation.py. \n
+
+frame_reader.py decodes single fields (such as events.breach) out of frame strings without parsing the whole frame. \n
+
+geometry.py holds precomputed board tables (in bounds mask, range offsets) shared by gamelib and the simulator. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
 
@@ -24,6 +37,9 @@ from .util import debug_write
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .threat_map import ThreatMap
+from .turn_budget import TurnBudget
+from .defense import DefenseOptimizer
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "defense", "frame_reader", "game_state", "game_map", "geometry", "navigation", "threat_map", "turn_budget", "unit", "util"]
  
\ No newline at end of file
@@ -1,8 +1,15 @@
 import json
+import threading
+import traceback
 
+from .frame_reader import FrameReader, read_board, turn_info
 from .game_state import GameState
+from .turn_budget import TurnBudget
 from .util import get_command, debug_write, BANNER_TEXT, send_command
 
+# Share of the turn budget the next turn waits for on_idle_compute to return after cancelling it
+IDLE_STOP_FRACTION = 0.05
+
 class AlgoCore(object):
     """
     This class handles communication with the game engine. \n
@@ -10,10 +17,20 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * frame_reader (FrameReader): The action frame fields passed to on_action_fields. Subscribe to fields in on_game_start
+        * final_action_frame (string): The last frame of the most recent finished action phase, None before the first one
 
     """
     def __init__(self):
         self.config = None
+        self.frame_reader = FrameReader()
+        self.final_action_frame = None
+        self._latest_action_frame = None
+        self._latest_action_board = None
+        self._final_action_board = None
+        self._idle_thread = None
+        self._idle_cancel = None
+        self._stale_idle_thread = None
 
     def on_game_start(self, config):
         """
@@ -43,6 +60,79 @@ class AlgoCore(object):
         """
         pass
 
+    def on_action_fields(self, fields):
+        """
+        Called for each action frame that has something in one of the fields subscribed to with
+        self.frame_reader.subscribe, after on_action_frame. Only those fields are decoded, so this
+        is much cheaper than parsing every frame in on_action_frame. \n
+        fields maps each non-empty subscribed path, for example "events.breach", to its value.
+        """
+        pass
+
+
+    def on_game_end(self):
+        """
+        Called once when the game engine sends the end state, before the algo exits. \n
+        Override it in algo_strategy.py to release anything started in on_game_start, such as worker processes.
+        """
+        pass
+
+    def on_idle_compute(self, cancel):
+        """
+        Opt in by overriding this. It is then started on a worker thread after each on_turn, and runs
+        while the engine plays out the action phase and sends its frames, so anything slow that can be
+        worked out ahead of time (path tables, threat maps, simulation candidates) is ready for the next turn. \n
+        cancel is a threading.Event that is set when the next turn (or the end of the game) arrives.
+        Check cancel.is_set() regularly and return soon after it is set: on_turn waits for this to return,
+        but only for IDLE_STOP_FRACTION of the turn budget. If it is still running after that, the turn
+        goes ahead without it and on_idle_compute isn't started again until it has returned.
+        on_action_frame and on_action_fields keep running on the main thread meanwhile, so guard any
+        state they share with this hook.
+        """
+        pass
+
+    def _idle_compute_enabled(self):
+        return type(self).on_idle_compute is not AlgoCore.on_idle_compute
+
+    def _run_idle_compute(self, cancel):
+        try:
+            self.on_idle_compute(cancel)
+        except Exception:
+            debug_write("on_idle_compute raised an exception:\n{}".format(traceback.format_exc()))
+
+    def _start_idle_compute(self):
+        if not self._idle_compute_enabled():
+            return
+        if self._stale_idle_thread is not None:
+            if self._stale_idle_thread.is_alive():
+                debug_write("on_idle_compute is still running from an earlier turn, not starting it again")
+                return
+            self._stale_idle_thread = None
+        self._idle_cancel = threading.Event()
+        self._idle_thread = threading.Thread(target=self._run_idle_compute, args=(self._idle_cancel,), daemon=True)
+        self._idle_thread.start()
+
+    def _stop_idle_compute(self):
+        """Cancels on_idle_compute and waits a short while for it to return"""
+        if self._idle_thread is None:
+            return
+        self._idle_cancel.set()
+        self._idle_thread.join(TurnBudget.from_config(self.config or {}).limit * IDLE_STOP_FRACTION)
+        if self._idle_thread.is_alive():
+            debug_write("on_idle_compute did not return after being cancelled, going ahead without it")
+            self._stale_idle_thread = self._idle_thread
+        self._idle_thread = None
+        self._idle_cancel = None
+
+    def get_last_action_board(self):
+        """
+        Gets the board at the end of the most recent action phase, ready to hand to the simulator. \n
+        Only the board fields are decoded, the events are never parsed. Each action frame's board is
+        decoded as the frame arrives, while the engine is still playing out the action phase, so this
+        is only a lookup on the turn. The board is shared, so treat it as read only.
+        Returns None before the first action phase.
+        """
+        return self._final_action_board
 
     def start(self):
         """ 
@@ -64,24 +154,41 @@ class AlgoCore(object):
                 parsed_config = json.loads(game_state_string)
                 self.on_game_start(parsed_config)
             elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
+                # only turnInfo is decoded here, the rest of the frame is left to the handlers
+                stateType = int(turn_info(game_state_string)[0])
                 if stateType == 0:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
+                    self._stop_idle_compute()
+                    if self._latest_action_frame is not None:
+                        # the action phase is over, so the latest frame was its last
+                        self.final_action_frame = self._latest_action_frame
+                        self._final_action_board = self._latest_action_board
+                        self._latest_action_frame = None
+                        self._latest_action_board = None
                     self.on_turn(game_state_string)
+                    self._start_idle_compute()
                 elif stateType == 1:
                     """
                     If stateType == 1, this game_state_string string represents a single frame of an action phase
                     """
+                    self._latest_action_frame = game_state_string
+                    # decoded now, off the next turn's clock, in case this is the phase's last frame
+                    self._latest_action_board = read_board(game_state_string)
                     self.on_action_frame(game_state_string)
+                    if self.frame_reader.subscriptions:
+                        fields = self.frame_reader.read(game_state_string)
+                        if fields:
+                            self.on_action_fields(fields)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
+                    self._stop_idle_compute()
                     debug_write("Got end state, game over. Stopping algo.")
+                    self.on_game_end()
                     break
                 else:
                     """
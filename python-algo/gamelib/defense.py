@@ -0,0 +1,206 @@
+from .geometry import ARENA_SIZE, HALF_ARENA, IN_BOUNDS, locations_in_range
+from .navigation import PathField
+from .unit import GameUnit
+
+
+class DefenseOptimizer:
+    """Greedily places the structures that best lengthen, block or damage the enemy's paths
+
+    Every enemy edge location is pathed once up front. After that a candidate cell only
+    needs re-pathing for the enemy paths that cross it, since blocking a cell no path uses
+    can't change which path a unit takes. Those paths are re-pathed on a PathField per
+    target edge, which only updates the distances the blocked cell affected. Cells off
+    every path are scored from the threat they add alone.
+
+    The optimizer keeps its own copy of the board's blocked locations, so structures
+    spawned or removed other than through run make it out of date.
+
+    The value of a placement is the damage it adds along the enemy paths, plus length_weight
+    per tile it adds to them, plus blocked_value for each path it stops from reaching our edge,
+    all divided by its SP cost.
+
+    Attributes :
+        * game_state (:obj: GameState): The turn to build in, placements are spawned into it
+        * unit_types (list): The structure types to try, turrets and walls by default
+        * candidates (list): The locations to try, every location on our side by default
+        * length_weight (float): Value of one extra tile of enemy path, in points of damage
+        * blocked_value (float): Value of an enemy path no longer reaching our edge, in points of damage
+
+    """
+    def __init__(self, game_state, unit_types=None, candidates=None, length_weight=1.0, blocked_value=20.0):
+        self.game_state = game_state
+        unit_information = game_state.config["unitInformation"]
+        self.unit_types = unit_types or [unit_information[2]["shorthand"], unit_information[0]["shorthand"]]
+        if candidates is None:
+            candidates = [[i // ARENA_SIZE, i % ARENA_SIZE] for i in range(ARENA_SIZE * ARENA_SIZE)
+                          if IN_BOUNDS[i] and i % ARENA_SIZE < HALF_ARENA]
+        self.candidates = candidates
+        self.length_weight = length_weight
+        self.blocked_value = blocked_value
+        # structure templates and the locations each could attack from each candidate, by unit type
+        self._units = {}
+        self._coverage = {}
+
+        game_map = game_state.game_map
+        starts = game_map.get_edge_locations(game_map.TOP_LEFT) + game_map.get_edge_locations(game_map.TOP_RIGHT)
+        self.starts = [start for start in starts if not game_state.contains_stationary_unit(start)]
+        self.paths = game_state.paths_from_all_edges(self.starts)
+        self.target_edges = [game_state.get_target_edge(start) for start in self.starts]
+        self.fields = {edge: PathField(game_map.get_edge_locations(edge), game_state) for edge in set(self.target_edges)}
+        self._index_paths()
+
+    def _index_paths(self):
+        """Rebuilds the per location path lookups after the paths change"""
+        # crossing[x * ARENA_SIZE + y] lists the paths through [x, y]
+        self.crossing = {}
+        for index, path in enumerate(self.paths):
+            for x, y in path:
+                self.crossing.setdefault(x * ARENA_SIZE + y, []).append(index)
+        threat_map = self.game_state.get_threat_map()
+        self.damage = [threat_map.path_damage(path, 1) for path in self.paths]
+        self.blocked = [self._is_blocked(start, path) for start, path in zip(self.starts, self.paths)]
+        # a cache of _repath, only valid until the next placement
+        self._repaths = {}
+
+    def _is_blocked(self, start, path):
+        return not self.game_state.game_map.is_on_edge(path[-1], self.game_state.get_target_edge(start))
+
+    def _repath(self, unit_type, location):
+        """Gets the new paths of the enemy paths crossing location if a structure were placed there
+
+        Returns:
+            A list of (path index, new path)
+
+        """
+        key = location[0] * ARENA_SIZE + location[1]
+        if key in self._repaths:
+            return self._repaths[key]
+
+        new_paths = {}
+        by_edge = {}
+        for index in self.crossing.get(key, []):
+            by_edge.setdefault(self.target_edges[index], []).append(index)
+        for edge, indices in by_edge.items():
+            field = self.fields[edge]
+            previous = field.block(location)
+            try:
+                for index in indices:
+                    new_paths[index] = field.reroute(self.paths[index], previous)
+            finally:
+                field.unblock(location, previous)
+
+        # paths that can no longer reach the edge self destruct, which takes a full search
+        self_destructing = [index for index, path in new_paths.items() if path is None]
+        if self_destructing:
+            game_map = self.game_state.game_map
+            game_map.add_unit(unit_type, location, 0)
+            paths = self.game_state.paths_from_all_edges([self.starts[index] for index in self_destructing])
+            game_map.remove_unit(location)
+            new_paths.update(zip(self_destructing, paths))
+
+        self._repaths[key] = list(new_paths.items())
+        return self._repaths[key]
+
+    def _covered(self, unit, location):
+        """Gets the flat indices of the locations a structure at location could attack"""
+        if unit.damage_i <= 0 or unit.attackRange <= 0:
+            return ()
+        key = (unit.unit_type, location[0] * ARENA_SIZE + location[1])
+        if key not in self._coverage:
+            hit_radius = self.game_state.get_threat_map().hit_radius
+            self._coverage[key] = frozenset(x * ARENA_SIZE + y for x, y in locations_in_range(location[0], location[1], unit.attackRange, hit_radius))
+        return self._coverage[key]
+
+    def evaluate(self, unit_type, location):
+        """Gets the value of placing a structure, before dividing by its cost
+
+        Args:
+            unit_type: The type of structure
+            location: An empty location on our side of the map
+
+        Returns:
+            The damage, path length and blocking the structure would add to the enemy's paths, see DefenseOptimizer
+
+        """
+        unit = self._units.get(unit_type)
+        if unit is None:
+            unit = self._units[unit_type] = GameUnit(unit_type, self.game_state.config, 0)
+        covered = self._covered(unit, location)
+        repaths = self._repath(unit_type, location)
+        threat = self.game_state.get_threat_map().threat[1]
+
+        value = 0.0
+        rerouted = set()
+        for index, new_path in repaths:
+            rerouted.add(index)
+            old_path = self.paths[index]
+            new_damage = sum(threat[x * ARENA_SIZE + y] for x, y in new_path)
+            new_damage += unit.damage_i * sum(1 for x, y in new_path if x * ARENA_SIZE + y in covered)
+            value += new_damage - self.damage[index]
+            value += self.length_weight * (len(new_path) - len(old_path))
+            value += self.blocked_value * (self._is_blocked(self.starts[index], new_path) - self.blocked[index])
+        for cell in covered:
+            value += unit.damage_i * sum(1 for index in self.crossing.get(cell, ()) if index not in rerouted)
+        return value
+
+    def best_placement(self, budget=None, skip=()):
+        """Finds the affordable placement with the most value per SP
+
+        Args:
+            budget: A TurnBudget, the search returns the best so far when it runs out
+            skip: (unit type, x, y) placements not to consider
+
+        Returns:
+            (value per SP, unit type, location), or None if nothing is affordable
+
+        """
+        game_state = self.game_state
+        best = None
+        for unit_type in self.unit_types:
+            cost = game_state.type_cost(unit_type)[game_state.SP]
+            if cost <= 0 or cost > game_state.get_resource(game_state.SP):
+                continue
+            for location in self.candidates:
+                if budget is not None and budget.expired():
+                    return best
+                if game_state.game_map[location] or (unit_type, location[0], location[1]) in skip:
+                    continue
+                value = self.evaluate(unit_type, location) / cost
+                if best is None or value > best[0]:
+                    best = (value, unit_type, location)
+        return best
+
+    def run(self, budget=None, min_value=0.0):
+        """Spawns the best placement, one at a time, until SP, time or worthwhile placements run out
+
+        Args:
+            budget: A TurnBudget, no placement is searched for once it runs out. Defaults to game_state.budget
+            min_value: Placements worth this much per SP or less are not made
+
+        Placements that fail to spawn, for example because the optimizer's copy of the board
+        is out of date, are skipped and the next best is tried.
+
+        Returns:
+            A list of the (unit type, location) spawned, in order
+
+        """
+        budget = budget or self.game_state.budget
+        placed = []
+        failed = set()
+        while not budget.expired():
+            with budget.measure("defense"):
+                best = self.best_placement(budget, failed)
+            if best is None or best[0] <= min_value:
+                break
+            _, unit_type, location = best
+            if not self.game_state.attempt_spawn(unit_type, location):
+                failed.add((unit_type, location[0], location[1]))
+                continue
+            placed.append((unit_type, location))
+            # only the paths that crossed the new structure can have changed
+            for index, new_path in self._repath(unit_type, location):
+                self.paths[index] = new_path
+            for field in self.fields.values():
+                field.block(location)
+            self._index_paths()
+        return placed
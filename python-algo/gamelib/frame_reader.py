@@ -0,0 +1,107 @@
+"""
+Reads single fields out of the json strings the engine sends, without decoding the rest.
+
+Action frames arrive hundreds of times per round and most strategies only look at
+one or two small parts of them, such as events.breach. Frames are searched for the
+quoted key names along a dotted path and only the value found there is decoded.
+Key names never appear inside values in engine output (values are numbers, arrays
+and unit ids), so the textual search finds the same value a full decode would.
+"""
+import json
+
+_decoder = json.JSONDecoder()
+
+
+def _value_index(frame, path):
+    """Gets the index where the value at a dotted path starts, or -1 if a key is missing"""
+    index = 0
+    for key in path.split("."):
+        index = frame.find('"' + key + '"', index)
+        if index == -1:
+            return -1
+        index += len(key) + 2
+        while index < len(frame) and frame[index] in " \t\r\n:":
+            index += 1
+    return index
+
+
+def read_field(frame, path, default=None):
+    """Decodes one field of a json frame string
+
+    Args:
+        frame: A frame (or turn) string as sent by the engine
+        path: The keys leading to the field, separated by dots. For example "turnInfo" or "events.breach"
+        default: Returned if the frame has no such field
+
+    Returns:
+        The decoded value of the field
+
+    """
+    index = _value_index(frame, path)
+    if index == -1:
+        return default
+    if frame.startswith("[]", index):
+        return []
+    value, _ = _decoder.raw_decode(frame, index)
+    return value
+
+
+def turn_info(frame):
+    """Gets the turnInfo of a frame: [frame type, turn number, action phase frame number, total frame number]"""
+    return read_field(frame, "turnInfo")
+
+
+# The fields of a frame that describe the board, everything but the events
+BOARD_FIELDS = ("turnInfo", "p1Stats", "p2Stats", "p1Units", "p2Units")
+
+
+def read_board(frame):
+    """Decodes the board of a frame, skipping its events
+
+    Args:
+        frame: A frame (or turn) string as sent by the engine
+
+    Returns:
+        A dict with the BOARD_FIELDS of the frame, in the same format as a full decode
+
+    """
+    return {path: read_field(frame, path) for path in BOARD_FIELDS}
+
+
+class FrameReader:
+    """Pulls the fields a strategy subscribed to out of each action frame
+
+    Attributes :
+        * subscriptions (list): The dotted paths of the subscribed fields, see read_field
+
+    """
+    def __init__(self, subscriptions=None):
+        self.subscriptions = list(subscriptions or [])
+
+    def subscribe(self, path):
+        """Asks for a field to be read out of every action frame
+
+        Args:
+            path: The keys leading to the field, separated by dots. For example "events.breach"
+
+        """
+        if path not in self.subscriptions:
+            self.subscriptions.append(path)
+
+    def read(self, frame):
+        """Reads the subscribed fields out of a frame
+
+        Args:
+            frame: An action frame string as sent by the engine
+
+        Returns:
+            A dict from path to value with every subscribed field that is present and not empty.
+            Empty if there is nothing of interest in the frame.
+
+        """
+        fields = {}
+        for path in self.subscriptions:
+            value = read_field(frame, path)
+            if value:
+                fields[path] = value
+        return fields
@@ -1,5 +1,6 @@
 import math
 from .unit import GameUnit
+from .geometry import ARENA_SIZE, EDGES, IN_BOUNDS, locations_in_range, on_edge
 from .util import debug_write
 
 class GameMap:
@@ -117,8 +118,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [list(location) for location in EDGES[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -127,27 +127,20 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[list(location) for location in edge] for edge in EDGES]
+
+    def is_on_edge(self, location, quadrant_description):
+        """Checks if a location lies on an edge, without building the edge's location list
+
+        Args:
+            location: A map location
+            quadrant_description: A constant corresponding to one of the 4 edges. See game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, and similar constants.
+
+        Returns:
+            True if the location is on the requested edge
+
+        """
+        return on_edge(location[0], location[1], quadrant_description)
     
     def add_unit(self, unit_type, location, player_index=0):
         """Add a single GameUnit to the map at the given location.
@@ -173,6 +166,22 @@ class GameMap:
         else:
             self.__map[x][y] = [new_unit]
 
+    def place_units(self, units):
+        """Puts already built GameUnits on the map at their own x, y, next to any units already there.
+
+        Args:
+            units: A list of GameUnits
+
+        Like add_unit, this only changes the data stored in GameMap. GameState uses it to fill in the map when parsing a turn.
+        """
+        grid = self.__map
+        for unit in units:
+            x, y = unit.x, unit.y
+            if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[x * ARENA_SIZE + y]):
+                self._invalid_coordinates([x, y])
+                continue
+            grid[x][y].append(unit)
+
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
 
@@ -205,16 +214,9 @@ class GameMap:
             self._invalid_coordinates(location)
 
         x, y = location
-        locations = []
-        search_radius = math.ceil(radius)
         getHitRadius = self.config["unitInformation"][0]['getHitRadius']
-        for i in range(int(x - search_radius), int(x + search_radius + 1)):
-            for j in range(int(y - search_radius), int(y + search_radius + 1)):
-                new_location = [i, j]
-                # A unit with a given range affects all locations whose centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
-                    locations.append(new_location)
-        return locations
+        # A unit with a given range affects all locations whose centers are within that range + get hit radius
+        return [[i, j] for i, j in locations_in_range(int(x), int(y), radius, getHitRadius)]
 
     def distance_between_locations(self, location_1, location_2):
         """Euclidean distance
@@ -4,8 +4,13 @@ import sys
 
 from .navigation import ShortestPathFinder
 from .util import send_command, debug_write
-from .unit import GameUnit
+from .unit import GameUnit, build_unit, unit_templates
 from .game_map import GameMap
+from .threat_map import ThreatMap
+from .turn_budget import TurnBudget
+
+# The config the unit type globals below were last bound from
+_bound_config = None
 
 def is_stationary(unit_type):
     """
@@ -44,6 +49,7 @@ class GameState:
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * budget (:obj: TurnBudget): Time used so far this turn. Parsing and pathing are recorded in it
 
     """
 
@@ -55,10 +61,41 @@ class GameState:
             * serialized_string (string): A string containing information about the game state at the start of this turn
 
         """
+        self.budget = TurnBudget.from_config(config)
         self.serialized_string = serialized_string
         self.config = config
         self.enable_warnings = True
 
+        # the unit type globals only need binding again when the config changes
+        global _bound_config
+        if _bound_config is not config:
+            self.__bind_unit_types(config)
+            _bound_config = config
+
+        self.ARENA_SIZE = 28
+        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
+        self.MP = 1
+        self.SP = 0
+        global MP, SP
+        MP = self.MP
+        SP = self.SP
+
+        self.game_map = GameMap(self.config)
+        self._shortest_path_finder = ShortestPathFinder()
+        # built on the first call to get_threat_map
+        self._threat_map = None
+        self._build_stack = []
+        self._deploy_stack = []
+        self._player_resources = [
+                {'SP': 0, 'MP': 0},  # player 0, which is you
+                {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
+        with self.budget.measure("parse"):
+            self.__parse_state(serialized_string)
+
+    def __bind_unit_types(self, config):
+        """
+        Binds the unit type constants (WALL, SUPPORT, ...) used throughout this module to the shorthands in config.
+        """
         global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
         UNIT_TYPE_TO_INDEX = {}
         WALL = config["unitInformation"][0]["shorthand"]
@@ -81,23 +118,6 @@ class GameState:
         ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
         STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
 
-        self.ARENA_SIZE = 28
-        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
-        self.MP = 1
-        self.SP = 0
-        global MP, SP
-        MP = self.MP
-        SP = self.SP
-
-        self.game_map = GameMap(self.config)
-        self._shortest_path_finder = ShortestPathFinder()
-        self._build_stack = []
-        self._deploy_stack = []
-        self._player_resources = [
-                {'SP': 0, 'MP': 0},  # player 0, which is you
-                {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
-        self.__parse_state(serialized_string)
-
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
@@ -129,25 +149,29 @@ class GameState:
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
+        Units are built from the cached per type templates, see unit.unit_templates.
         """
         typedef = self.config.get("unitInformation")
+        templates = unit_templates(self.config)
         for i, unit_types in enumerate(units):
-            for uinfo in unit_types:
-                unit_type = typedef[i].get("shorthand")
-                sx, sy, shp = uinfo[:3]
-                x, y = map(int, [sx, sy])
-                hp = float(shp)
-                # This depends on RM and UP always being the last types to be processed
-                if unit_type == REMOVE:
+            if not unit_types:
+                continue
+            unit_type = typedef[i].get("shorthand")
+            # This depends on RM and UP always being the last types to be processed
+            if unit_type == REMOVE:
+                for uinfo in unit_types:
+                    x, y = int(uinfo[0]), int(uinfo[1])
                     # Quick fix will deploy engine fix soon
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].pending_removal = True
-                elif unit_type == UPGRADE:
+            elif unit_type == UPGRADE:
+                for uinfo in unit_types:
+                    x, y = int(uinfo[0]), int(uinfo[1])
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].upgrade()
-                else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+            else:
+                template = templates[unit_type]
+                self.game_map.place_units([build_unit(template, player_number, float(uinfo[2]), int(uinfo[0]), int(uinfo[1])) for uinfo in unit_types])
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -333,7 +357,7 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = self.game_map.is_on_edge(location, self.game_map.BOTTOM_LEFT) or self.game_map.is_on_edge(location, self.game_map.BOTTOM_RIGHT)
 
         if self.enable_warnings:
             fail_reason = ""
@@ -383,6 +407,8 @@ class GameState:
                     self.__set_resource(MP, 0 - costs[MP])
                     self.game_map.add_unit(unit_type, location, 0)
                     if is_stationary(unit_type):
+                        if self._threat_map is not None:
+                            self._threat_map.add_unit(self.game_map[x, y][0])
                         self._build_stack.append((unit_type, x, y))
                     else:
                         self._deploy_stack.append((unit_type, x, y))
@@ -445,13 +471,32 @@ class GameState:
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
+                        if self._threat_map is not None:
+                            self._threat_map.remove_unit(existing_unit)
                         existing_unit.upgrade()
+                        if self._threat_map is not None:
+                            self._threat_map.add_unit(existing_unit)
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
                 self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.".format(location))
         return spawned_units
 
+    def get_threat_map(self):
+        """Gets the damage per frame enemy structures can deal on each location
+
+        The map is built on the first call and then kept up to date by attempt_spawn and
+        attempt_upgrade. attempt_remove leaves it alone, since structures flagged for
+        removal still fight during the coming action phase.
+
+        Returns:
+            A ThreatMap for the current board, including the structures you have spawned this turn
+
+        """
+        if self._threat_map is None:
+            self._threat_map = ThreatMap(self.game_map)
+        return self._threat_map
+
     def get_target_edge(self, start_location):
         """Gets the target edge given a starting location
 
@@ -496,7 +541,39 @@ class GameState:
             target_edge = self.get_target_edge(start_location)
 
         end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        with self.budget.measure("pathing"):
+            return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+
+    def paths_from_all_edges(self, start_locations=None):
+        """Gets the path a unit would take from each of a set of locations, sharing the work between them
+
+        Locations are grouped by the edge they target and each group is pathed in one pass,
+        so pathing from every friendly edge location usually costs two searches instead of 28.
+
+        Args:
+            start_locations: The locations of hypothetical units. Defaults to every location on our two edges,
+                bottom left then bottom right, including blocked ones.
+
+        Returns:
+            A list with the path from each location, in the same order as start_locations,
+            as find_path_to_edge would return it. None for locations holding a structure.
+
+        """
+        if start_locations is None:
+            start_locations = self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT)
+
+        by_edge = {}
+        for index, location in enumerate(start_locations):
+            by_edge.setdefault(self.get_target_edge(location), []).append(index)
+
+        paths = [None] * len(start_locations)
+        with self.budget.measure("pathing"):
+            for target_edge, indices in by_edge.items():
+                end_points = self.game_map.get_edge_locations(target_edge)
+                edge_paths = self._shortest_path_finder.navigate_from_multiple_starts([start_locations[i] for i in indices], end_points, self)
+                for index, path in zip(indices, edge_paths):
+                    paths[index] = path
+        return paths
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
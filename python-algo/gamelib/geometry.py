@@ -0,0 +1,191 @@
+"""
+Precomputed board geometry shared by gamelib and the simulator.
+
+Everything in here depends only on the shape of the arena, so it is built once
+per process and then reused by every GameMap and SimGameMap.
+"""
+import math
+
+ARENA_SIZE = 28
+HALF_ARENA = 14
+
+
+def _diamond_contains(x, y):
+    if y < HALF_ARENA:
+        return HALF_ARENA - 1 - y <= x <= HALF_ARENA + y
+    return y - HALF_ARENA <= x <= ARENA_SIZE - 1 - (y - HALF_ARENA)
+
+# In-bounds mask for the whole board, indexed by x * ARENA_SIZE + y
+IN_BOUNDS = bytes(_diamond_contains(i // ARENA_SIZE, i % ARENA_SIZE) for i in range(ARENA_SIZE * ARENA_SIZE))
+
+# Edge indices, matching GameMap.TOP_RIGHT, GameMap.TOP_LEFT, ...
+TOP_RIGHT = 0
+TOP_LEFT = 1
+BOTTOM_LEFT = 2
+BOTTOM_RIGHT = 3
+
+# The locations along each edge, indexed as above, ordered from the middle of the board outwards
+EDGES = (
+    tuple((HALF_ARENA + i, ARENA_SIZE - 1 - i) for i in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - i, ARENA_SIZE - 1 - i) for i in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - i, i) for i in range(HALF_ARENA)),
+    tuple((HALF_ARENA + i, i) for i in range(HALF_ARENA)),
+)
+
+def _edge_bits(index):
+    x, y = divmod(index, ARENA_SIZE)
+    return sum(1 << edge for edge, locations in enumerate(EDGES) if (x, y) in locations)
+
+# Bit (1 << edge) is set for every edge a location lies on, indexed by x * ARENA_SIZE + y
+EDGE_MASK = bytes(_edge_bits(i) for i in range(ARENA_SIZE * ARENA_SIZE))
+
+# reach -> offsets in range, see range_offsets
+_offset_tables = {}
+# reach -> per cell list of the in bounds locations in range, filled lazily
+_location_tables = {}
+# reach -> per cell list of the in bounds (x, y, distance) in range, filled lazily
+_distance_tables = {}
+
+
+def in_bounds(x, y):
+    """Checks if the given location is inside the diamond shaped game board.
+
+    Args:
+        x, y: A map location
+
+    Returns:
+        True if the location is on the board, False otherwise
+
+    """
+    return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[x * ARENA_SIZE + y] == 1
+
+
+def on_edge(x, y, edge):
+    """Checks if a location lies on the given edge
+
+    Args:
+        x, y: A map location
+        edge: One of TOP_RIGHT, TOP_LEFT, BOTTOM_LEFT or BOTTOM_RIGHT
+
+    Returns:
+        True if the location is one of the edge's locations
+
+    """
+    return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and EDGE_MASK[x * ARENA_SIZE + y] >> edge & 1 == 1
+
+
+def range_offsets(radius, hit_radius=0.01):
+    """Gets the offsets covered by a circle of the given radius
+
+    A unit with a given range affects all locations whose centers are within that range + get hit radius.
+
+    Args:
+        radius: The radius of our search area
+        hit_radius: getHitRadius from the config
+
+    Returns:
+        A tuple of (dx, dy, distance) entries, ordered by dx then dy
+        (the order get_locations_in_range has always returned locations in)
+
+    """
+    reach = radius + hit_radius
+    offsets = _offset_tables.get(reach)
+    if offsets is None:
+        search_radius = math.ceil(radius)
+        offsets = []
+        for dx in range(-search_radius, search_radius + 1):
+            for dy in range(-search_radius, search_radius + 1):
+                distance = math.sqrt(dx**2 + dy**2)
+                if distance < reach:
+                    offsets.append((dx, dy, distance))
+        offsets = tuple(offsets)
+        _offset_tables[reach] = offsets
+    return offsets
+
+
+def locations_in_range(x, y, radius, hit_radius=0.01):
+    """Gets the in bounds locations in a circular area around a location
+
+    Results are cached per cell, so repeated queries are a table lookup.
+
+    Args:
+        x, y: The center of our search area
+        radius: The radius of our search area
+        hit_radius: getHitRadius from the config
+
+    Returns:
+        A tuple of (x, y) locations. It is shared between callers, do not modify it.
+
+    """
+    reach = radius + hit_radius
+    table = _location_tables.get(reach)
+    if table is None:
+        table = [None] * (ARENA_SIZE * ARENA_SIZE)
+        _location_tables[reach] = table
+
+    cacheable = 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE
+    if cacheable:
+        locations = table[x * ARENA_SIZE + y]
+        if locations is not None:
+            return locations
+
+    locations = tuple((x + dx, y + dy) for dx, dy, _ in range_offsets(radius, hit_radius) if in_bounds(x + dx, y + dy))
+    if cacheable:
+        table[x * ARENA_SIZE + y] = locations
+    return locations
+
+
+def locations_with_distance(x, y, radius, hit_radius=0.01):
+    """Same as locations_in_range, but each entry also carries its distance from (x, y)
+
+    Args:
+        x, y: The center of our search area
+        radius: The radius of our search area
+        hit_radius: getHitRadius from the config
+
+    Returns:
+        A tuple of (x, y, distance) entries. It is shared between callers, do not modify it.
+
+    """
+    reach = radius + hit_radius
+    table = _distance_tables.get(reach)
+    if table is None:
+        table = [None] * (ARENA_SIZE * ARENA_SIZE)
+        _distance_tables[reach] = table
+
+    cacheable = 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE
+    if cacheable:
+        locations = table[x * ARENA_SIZE + y]
+        if locations is not None:
+            return locations
+
+    locations = tuple((x + dx, y + dy, distance) for dx, dy, distance in range_offsets(radius, hit_radius) if in_bounds(x + dx, y + dy))
+    if cacheable:
+        table[x * ARENA_SIZE + y] = locations
+    return locations
+
+
+def precompute_ranges(config):
+    """Builds the offset tables and the per cell caches for every range in the config up front
+
+    After this, locations_in_range and locations_with_distance are table lookups for
+    every in bounds cell and every range in the config, from the first turn on.
+
+    Args:
+        config: A json object containing information about the game
+
+    """
+    hit_radius = config["unitInformation"][0].get("getHitRadius", 0.01)
+    radii = set()
+    for unit_info in config["unitInformation"]:
+        for info in [unit_info, unit_info.get("upgrade", {})]:
+            for key in ["attackRange", "shieldRange", "selfDestructRange"]:
+                if info.get(key, 0) > 0:
+                    radii.add(info[key])
+    for radius in radii:
+        range_offsets(radius, hit_radius)
+        for i in range(ARENA_SIZE * ARENA_SIZE):
+            if IN_BOUNDS[i]:
+                x, y = divmod(i, ARENA_SIZE)
+                locations_in_range(x, y, radius, hit_radius)
+                locations_with_distance(x, y, radius, hit_radius)
@@ -1,24 +1,23 @@
 import heapq
-import math
 import sys
-import queue
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from .geometry import ARENA_SIZE, IN_BOUNDS
 from .util import debug_write
 
-class Node:
-    """A path-finding node
+# Flat indices (x * ARENA_SIZE + y) of every in bounds location
+IN_BOUNDS_INDICES = tuple(i for i in range(ARENA_SIZE * ARENA_SIZE) if IN_BOUNDS[i])
 
-    Attributes :
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a structures at this node's location
-        * pathlength: The distance between this node and the target location
 
-    """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
+def _flat_neighbors(index):
+    x, y = divmod(index, ARENA_SIZE)
+    locations = ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y))
+    return tuple(x * ARENA_SIZE + y for x, y in locations
+                 if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[x * ARENA_SIZE + y])
+
+# Flat indices of the in bounds neighbors of each location
+NEIGHBORS = tuple(_flat_neighbors(i) for i in range(ARENA_SIZE * ARENA_SIZE))
 
 """
 This class helps with pathfinding. We guarantee the results will
@@ -28,18 +27,30 @@ code to maximise time efficiency
 class ShortestPathFinder:
     """Handles path-finding
 
+    The search state lives in flat arrays indexed by x * ARENA_SIZE + y, allocated
+    once and reset before every search.
+
     Attributes :
         * HORIZONTAL (int): A constant representing a horizontal movement
         * VERTICAL (int): A constant representing a vertical movement
 
         * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * blocked (bytearray): 1 if there is a structure at the location
+        * visited_idealness (array): The label of the idealness search that visited the location, 0 if none did
+        * pathlength (array): The distance between each location and the target location, -1 if not reached
 
     """
     def __init__(self):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        cells = ARENA_SIZE * ARENA_SIZE
+        self._empty_flags = bytes(cells)
+        self._empty_labels = array('H', [0]) * cells
+        self._empty_pathlength = array('i', [-1]) * cells
+        self.blocked = bytearray(cells)
+        self.visited_idealness = array('H', self._empty_labels)
+        self.pathlength = array('i', self._empty_pathlength)
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -50,7 +61,9 @@ class ShortestPathFinder:
         #Initialize map 
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        self.blocked[:] = self._empty_flags
+        self.visited_idealness[:] = self._empty_labels
+        self.pathlength[:] = self._empty_pathlength
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -70,42 +83,109 @@ class ShortestPathFinder:
 
         #Initialize map 
         self.initialize_map(game_state)
-        #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
+        self._fill_blocked(game_state)
         #Do pathfinding
         ideal_endpoints = self._idealness_search(start_point, end_points)
         self._validate(ideal_endpoints, end_points)
         return self._get_path(start_point, end_points)
 
-    def _idealness_search(self, start, end_points):
+    def navigate_from_multiple_starts(self, start_points, end_points, game_state):
+        """Finds the paths units at each of several start points would take to reach a set of endpoints
+
+        The blocked grid is filled in once for all start points. Start points in the same
+        pocket of pathable space share an idealness search, and start points heading for
+        the same ideal tile share a distance field, so pathing from a whole edge usually
+        costs a single search.
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A list with the path from each start point, in the same order as start_points,
+            each as navigate_multiple_endpoints would return it. None for blocked start points.
+
+        """
+        self.initialize_map(game_state)
+        self._fill_blocked(game_state)
+
+        paths = []
+        # pocket label -> ideal tile of that pocket
+        ideal_tiles = {}
+        # None for the endpoints, or the ideal tile -> its distance field
+        distance_fields = {}
+        current_field = False
+        for start_point in start_points:
+            if game_state.contains_stationary_unit(start_point):
+                paths.append(None)
+                continue
+
+            label = self.visited_idealness[start_point[0] * ARENA_SIZE + start_point[1]]
+            if not label:
+                label = len(ideal_tiles) + 1
+                ideal_tiles[label] = self._idealness_search(start_point, end_points, label)
+            ideal_tile = ideal_tiles[label]
+
+            field = None if ideal_tile in end_points else tuple(ideal_tile)
+            if field != current_field:
+                if field in distance_fields:
+                    self.pathlength[:] = distance_fields[field]
+                else:
+                    self.pathlength[:] = self._empty_pathlength
+                    self._validate(ideal_tile, end_points)
+                    distance_fields[field] = array('i', self.pathlength)
+                current_field = field
+            paths.append(self._get_path(start_point, end_points))
+        return paths
+
+    def _fill_blocked(self, game_state):
+        """Marks every location holding a structure as blocked"""
+        game_map = game_state.game_map
+        blocked = self.blocked
+        for index in IN_BOUNDS_INDICES:
+            for unit in game_map[index // ARENA_SIZE, index % ARENA_SIZE]:
+                if unit.stationary:
+                    blocked[index] = 1
+                    break
+
+    def _is_pathable(self, x, y):
+        """In the arena and not blocked by a structure"""
+        if x < 0 or y < 0 or x >= ARENA_SIZE or y >= ARENA_SIZE:
+            return False
+        index = x * ARENA_SIZE + y
+        return IN_BOUNDS[index] == 1 and not self.blocked[index]
+
+    def _idealness_search(self, start, end_points, label=1):
         """
         Finds the most ideal tile in our 'pocket' of pathable space. 
         The edge if it is available, or the best self destruct location otherwise
+
+        Every tile in the pocket is marked with label in visited_idealness
         """
-        current = queue.Queue()
-        current.put(start)
+        visited = self.visited_idealness
+        current = deque([start])
         best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
+        visited[start[0] * ARENA_SIZE + start[1]] = label
         most_ideal = start
 
-        while not current.empty():
-            search_location = current.get()
+        while current:
+            search_location = current.popleft()
             for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+                x, y = neighbor
+                if not self._is_pathable(x, y):
                     continue
 
-                x, y = neighbor
                 current_idealness = self._get_idealness(neighbor, end_points)
 
                 if current_idealness > best_idealness:
                     best_idealness = current_idealness
                     most_ideal = neighbor
 
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+                index = x * ARENA_SIZE + y
+                if not visited[index]:
+                    visited[index] = label
+                    current.append(neighbor)
 
         return most_ideal
 
@@ -159,36 +239,34 @@ class ShortestPathFinder:
         return idealness
 
     def _validate(self, ideal_tile, end_points):
-        """Breadth first search of the grid, setting the pathlengths of each node
+        """Breadth first search of the grid, setting the pathlength of each location
 
         """
+        pathlength = self.pathlength
+        blocked = self.blocked
         #VALIDATION
         #Add our most ideal tiles to current
-        current = queue.Queue()
-        if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
-        else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
+        current = deque()
+        for location in (end_points if ideal_tile in end_points else [ideal_tile]):
+            #Set current pathlength to 0
+            pathlength[location[0] * ARENA_SIZE + location[1]] = 0
+            current.append(location)
 
         #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
+        while current:
+            current_location = current.popleft()
+            current_index = current_location[0] * ARENA_SIZE + current_location[1]
+            if blocked[current_index]:
+                continue
             for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+                x, y = neighbor
+                if not self._is_pathable(x, y):
                     continue
 
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
+                index = x * ARENA_SIZE + y
+                if pathlength[index] == -1:
+                    pathlength[index] = pathlength[current_index] + 1
+                    current.append(neighbor)
 
         #debug_write("Print after validate")
         #self.print_map()
@@ -199,12 +277,14 @@ class ShortestPathFinder:
 
         """
         #GET THE PATH
-        path = [start_point]
-        current = start_point
-        move_direction = 0
+        return self._continue_path([start_point], 0, end_points)
+
+    def _continue_path(self, path, move_direction, end_points):
+        """Extends a path, whose last move was in move_direction, to its target"""
+        current = path[-1]
 
-        while not self.game_map[current[0]][current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0]][current[1]].pathlength))
+        while not self.pathlength[current[0] * ARENA_SIZE + current[1]] == 0:
+            #debug_write("current tile {} has cost {}".format(current, self.pathlength[current[0] * ARENA_SIZE + current[1]]))
             next_move = self._choose_next_move(current, move_direction, end_points)
             #debug_write(next_move)
 
@@ -225,15 +305,15 @@ class ShortestPathFinder:
         #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
 
         ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
+        best_pathlength = self.pathlength[current_point[0] * ARENA_SIZE + current_point[1]]
         for neighbor in neighbors:
             #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+            x, y = neighbor
+            if not self._is_pathable(x, y):
                 continue
 
             new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x][y].pathlength
+            current_pathlength = self.pathlength[x * ARENA_SIZE + y]
 
             #Filter by pathlength
             if current_pathlength > best_pathlength:
@@ -299,9 +379,9 @@ class ShortestPathFinder:
 
         for y in range(28):
             for x in range(28):
-                node = self.game_map[x][28 - y - 1]
-                if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+                index = x * ARENA_SIZE + 28 - y - 1
+                if not self.blocked[index] and not self.pathlength[index] == -1:
+                    self._print_justified(self.pathlength[index])
                 else:
                     sys.stderr.write("   ")
             debug_write("")
@@ -314,3 +394,168 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+class PathField:
+    """The distances to an edge, kept up to date as single locations are blocked
+
+    Blocking a location only recomputes the distances of the locations whose shortest
+    route to the edge went through it, so trying out many candidate structures costs a
+    small local update each instead of a new search. The distances always match what
+    ShortestPathFinder would compute from scratch.
+
+    Only units whose pocket of pathable space reaches the edge follow these distances,
+    path returns None for the others (they self destruct, see ShortestPathFinder).
+
+    Attributes :
+        * end_points (list): The edge locations
+        * finder (:obj: ShortestPathFinder): Holds the blocked grid and the distances
+
+    """
+    def __init__(self, end_points, game_state):
+        """
+        Args:
+            * end_points: The edge locations, such as game_map.get_edge_locations(game_map.BOTTOM_LEFT)
+            * game_state: The GameState whose structures block the way
+
+        """
+        self.end_points = end_points
+        self._end_indices = {x * ARENA_SIZE + y for x, y in end_points}
+        self.finder = ShortestPathFinder()
+        self.finder.initialize_map(game_state)
+        self.finder._fill_blocked(game_state)
+        self.finder._validate(end_points[0], end_points)
+
+    def path(self, start_point):
+        """Gets the path a unit at start_point would take to the edge
+
+        Returns:
+            The path, as navigate_multiple_endpoints would return it, or None if the
+            start point is blocked or can't reach the edge
+
+        """
+        index = start_point[0] * ARENA_SIZE + start_point[1]
+        if self.finder.blocked[index] or self.finder.pathlength[index] == -1:
+            return None
+        return self.finder._get_path(list(start_point), self.end_points)
+
+    def reroute(self, path, previous):
+        """Gets the path a unit takes after block, given the path it took before
+
+        The unit follows its old path up to the first location next to a changed distance,
+        so only the rest of the path is searched again.
+
+        Args:
+            * path: The path from the start point before the location was blocked
+            * previous: What block returned
+
+        Returns:
+            The new path, as path would return it
+
+        """
+        pathlength = self.finder.pathlength
+        start_index = path[0][0] * ARENA_SIZE + path[0][1]
+        if self.finder.blocked[start_index] or pathlength[start_index] == -1:
+            return None
+        if not previous:
+            return list(path)
+
+        near = set(previous)
+        for index in previous:
+            near.update(NEIGHBORS[index])
+        for step, (x, y) in enumerate(path):
+            if x * ARENA_SIZE + y in near:
+                break
+        else:
+            return list(path)
+        # the direction of the move into the location the unit may diverge from
+        move_direction = 0
+        if step > 0:
+            move_direction = self.finder.VERTICAL if path[step - 1][0] == x else self.finder.HORIZONTAL
+        return self.finder._continue_path([list(location) for location in path[:step + 1]], move_direction, self.end_points)
+
+    def block(self, location):
+        """Blocks a location and updates the distances that depended on it
+
+        Args:
+            * location: The location of a new structure
+
+        Returns:
+            The previous distance of every location that changed, to pass to unblock
+
+        """
+        pathlength = self.finder.pathlength
+        blocked = self.finder.blocked
+        index = location[0] * ARENA_SIZE + location[1]
+        if blocked[index]:
+            return None
+        blocked[index] = 1
+        previous = {index: pathlength[index]}
+        if pathlength[index] == -1:
+            return previous
+
+        # locations whose every neighbor one step closer to the edge is affected, in order of distance
+        affected = {index}
+        queue = deque([index])
+        while queue:
+            current = queue.popleft()
+            distance = pathlength[current]
+            for neighbor in NEIGHBORS[current]:
+                if neighbor in affected or blocked[neighbor] or pathlength[neighbor] != distance + 1:
+                    continue
+                if any(pathlength[other] == distance and not blocked[other] and other not in affected
+                       for other in NEIGHBORS[neighbor]):
+                    continue
+                affected.add(neighbor)
+                queue.append(neighbor)
+
+        for changed in affected:
+            previous[changed] = pathlength[changed]
+            pathlength[changed] = -1
+        # blocked end points keep their 0, as in a full search
+        if index in self._end_indices:
+            pathlength[index] = 0
+
+        # route the affected locations around the new structure, from the unaffected ones bordering them
+        heap = []
+        for changed in affected:
+            if changed == index:
+                continue
+            border = [pathlength[other] for other in NEIGHBORS[changed]
+                      if other not in affected and not blocked[other] and pathlength[other] != -1]
+            if border:
+                heap.append((min(border) + 1, changed))
+        heapq.heapify(heap)
+        while heap:
+            distance, current = heapq.heappop(heap)
+            if pathlength[current] != -1:
+                continue
+            pathlength[current] = distance
+            for neighbor in NEIGHBORS[current]:
+                if neighbor in affected and not blocked[neighbor] and pathlength[neighbor] == -1:
+                    heapq.heappush(heap, (distance + 1, neighbor))
+        return previous
+
+    def unblock(self, location, previous):
+        """Undoes block
+
+        Args:
+            * location: The location passed to block
+            * previous: What block returned
+
+        """
+        if previous is None:
+            return
+        self.finder.blocked[location[0] * ARENA_SIZE + location[1]] = 0
+        pathlength = self.finder.pathlength
+        for index, distance in previous.items():
+            pathlength[index] = distance
+
+    @contextmanager
+    def blocked(self, location):
+        """Blocks a location for the duration of a with block"""
+        previous = self.block(location)
+        try:
+            yield self
+        finally:
+            self.unblock(location, previous)
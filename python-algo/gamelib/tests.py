@@ -1,7 +1,17 @@
 import unittest
 import json
+import threading
+import time
+from unittest import mock
 from .game_state import GameState
 from .unit import GameUnit
+from .threat_map import ThreatMap
+from .algocore import AlgoCore
+from .frame_reader import FrameReader, read_board, read_field
+from .turn_budget import TurnBudget
+from .navigation import PathField
+from .defense import DefenseOptimizer
+from . import geometry
 
 class BasicTests(unittest.TestCase):
 
@@ -239,6 +249,240 @@ class BasicTests(unittest.TestCase):
         game = self.make_turn_0_map()
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3.5)), "Wrong number of tiles in range")
+        self.assertEqual(9, len(game.game_map.get_locations_in_range([0,13], 2.5)), "Out of bounds tiles are being marked as in range")
+
+    def test_range_cache(self):
+        game = self.make_turn_0_map()
+        first = game.game_map.get_locations_in_range([5,10], 4.5)
+        first.append([-1, -1])
+        first[0][0] = 99
+        second = game.game_map.get_locations_in_range([5,10], 4.5)
+        self.assertNotIn([-1, -1], second, "Cached range results are shared with callers")
+        self.assertNotEqual(99, second[0][0], "Cached range results are shared with callers")
+
+        geometry.precompute_ranges(game.config)
+        table = geometry._location_tables[4.5 + 0.01]
+        self.assertTrue(all(table[i] is not None for i in range(len(table)) if geometry.IN_BOUNDS[i]), "precompute_ranges left cells to fill lazily")
+
+    def test_edges(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        edges = game_map.get_edges()
+        self.assertEqual([14, 27], edges[game_map.TOP_RIGHT][0])
+        self.assertEqual([0, 14], edges[game_map.TOP_LEFT][-1])
+        self.assertEqual([13, 0], edges[game_map.BOTTOM_LEFT][0])
+        self.assertEqual([27, 13], edges[game_map.BOTTOM_RIGHT][-1])
+        for edge, locations in enumerate(edges):
+            for location in game_map:
+                self.assertEqual(location in locations, game_map.is_on_edge(location, edge), "Edge lookup disagrees with the edge list at {}".format(location))
+        edges[0].append([-1, -1])
+        self.assertNotIn([-1, -1], game_map.get_edges()[0], "Edge tables are shared with callers")
+
+    def test_pathfinding(self):
+        game = self.make_turn_0_map()
+        for x in range(8, 20):
+            game.game_map.add_unit("FF", [x, 10], 0)
+        path = game.find_path_to_edge([13, 0], game.game_map.TOP_RIGHT)
+        self.assertEqual([13, 0], path[0])
+        self.assertIn(path[-1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT))
+        for (x1, y1), (x2, y2) in zip(path, path[1:]):
+            self.assertEqual(1, abs(x1 - x2) + abs(y1 - y2), "Path steps between {} and {}".format([x1, y1], [x2, y2]))
+            self.assertFalse(game.contains_stationary_unit([x2, y2]), "Path goes through a wall at {}".format([x2, y2]))
+        self.assertEqual(path, game.find_path_to_edge([13, 0], game.game_map.TOP_RIGHT), "Path finder kept state between searches")
+        self.assertIsNone(game.find_path_to_edge([8, 10]), "Path from inside a wall")
+
+    def test_paths_from_all_edges(self):
+        game = self.make_turn_0_map()
+        for x in range(8, 20):
+            game.game_map.add_unit("FF", [x, 10], 0)
+        game.game_map.add_unit("FF", [13, 0], 0)
+        starts = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+        paths = game.paths_from_all_edges()
+        self.assertEqual(len(starts), len(paths))
+        self.assertIsNone(paths[0], "Path from inside a wall")
+        for start, path in zip(starts[1:], paths[1:]):
+            self.assertEqual(game.find_path_to_edge(start), path, "Shared pathing disagrees with find_path_to_edge from {}".format(start))
+
+    def test_path_field(self):
+        game = self.make_turn_0_map()
+        for x in range(8, 20):
+            game.game_map.add_unit("FF", [x, 10], 0)
+        end_points = game.game_map.get_edge_locations(game.game_map.TOP_RIGHT)
+        field = PathField(end_points, game)
+        path = field.path([13, 0])
+        self.assertEqual(game.find_path_to_edge([13, 0], game.game_map.TOP_RIGHT), path)
+
+        for location in ([20, 10], path[len(path) // 2], [14, 27]):
+            previous = field.block(location)
+            game.game_map.add_unit("FF", location, 0)
+            self.assertEqual(PathField(end_points, game).finder.pathlength, field.finder.pathlength, "Blocking {} gave different distances".format(location))
+            self.assertEqual(game.find_path_to_edge([13, 0], game.game_map.TOP_RIGHT), field.reroute(path, previous))
+            game.game_map.remove_unit(location)
+            field.unblock(location, previous)
+        self.assertEqual(PathField(end_points, game).finder.pathlength, field.finder.pathlength, "unblock did not restore the distances")
+
+    def test_defense_optimizer(self):
+        game = self.make_turn_0_map()
+        optimizer = DefenseOptimizer(game)
+        for location in ([13, 13], [5, 10], [20, 6]):
+            for unit_type in ("FF", "DF"):
+                value = optimizer.evaluate(unit_type, location)
+                game.game_map.add_unit(unit_type, location, 0)
+                threat_map = ThreatMap(game.game_map)
+                expected = 0
+                new_paths = game.paths_from_all_edges(optimizer.starts)
+                for start, old_path, new_path, old_damage in zip(optimizer.starts, optimizer.paths, new_paths, optimizer.damage):
+                    expected += threat_map.path_damage(new_path, 1) - old_damage
+                    expected += len(new_path) - len(old_path)
+                    expected += 20 * (optimizer._is_blocked(start, new_path) - optimizer._is_blocked(start, old_path))
+                game.game_map.remove_unit(location)
+                self.assertAlmostEqual(expected, value, msg="Incremental value of {} at {} is off".format(unit_type, location))
+
+        placed = optimizer.run()
+        self.assertTrue(placed, "Nothing was built")
+        for unit_type, location in placed:
+            self.assertEqual(unit_type, game.game_map[location][0].unit_type)
+        self.assertLess(game.get_resource(game.SP), game.type_cost("FF")[game.SP], "SP was left unspent")
+        self.assertEqual(game.paths_from_all_edges(optimizer.starts), optimizer.paths, "Paths were not kept up to date")
+
+        # a placement that fails to spawn is skipped rather than ending the run
+        game = self.make_turn_0_map()
+        optimizer = DefenseOptimizer(game)
+        self.assertEqual([], optimizer.run(TurnBudget(0)), "A run with no time left should not place anything")
+        attempt_spawn = game.attempt_spawn
+        failed = []
+        def fail_first(unit_type, location, num=1):
+            if not failed:
+                failed.append((unit_type, location))
+                return 0
+            return attempt_spawn(unit_type, location, num)
+        with mock.patch.object(game, "attempt_spawn", side_effect=fail_first):
+            placed = optimizer.run()
+        self.assertTrue(failed)
+        self.assertNotIn(failed[0], placed, "The failed placement was retried")
+        self.assertLess(game.get_resource(game.SP), game.type_cost("FF")[game.SP], "SP was left unspent after a failed spawn")
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 16], 1)
+        game.game_map.add_unit("DF", [14, 17], 1)
+        game.game_map.add_unit("FF", [12, 14], 1)
+        threat_map = game.get_threat_map()
+        for location in game.game_map:
+            expected = sum(unit.damage_i for unit in game.get_attackers(location, 0) if unit.stationary)
+            self.assertEqual(expected, threat_map.get_threat(location, 0), "Wrong threat at {}".format(location))
+        self.assertEqual(5, threat_map.get_threat([13, 14], 0))
+        self.assertEqual(15, threat_map.path_damage([[13, 14], [13, 15]], 0))
+
+        game.attempt_spawn("DF", [13, 6])
+        game.attempt_upgrade([13, 6])
+        self.assertTrue(game.game_map[13, 6][0].upgraded)
+        self.assertEqual(ThreatMap(game.game_map).threat, threat_map.threat, "Threat map was not kept up to date")
+        self.assertEqual(15, threat_map.get_threat([13, 9], 1))
+
+        # a structure reaches locations within attackRange + getHitRadius, as in get_locations_in_range
+        turret = GameUnit("DF", game.config, 0, None, 5, 5)
+        turret.attackRange = 2.995
+        threat_map.add_unit(turret)
+        self.assertEqual(5, threat_map.get_threat([5, 8], 1), "Threat stops short of the hit radius")
+
+    def test_frame_reader(self):
+        frame = '{"p2Units":[[],[],[]],"turnInfo":[1,3,12,80],"p1Stats":[30.0,4.0,1.2,100],"events":{"selfDestruct":[],"breach":[[[13,27],1.0,3,"77",2]],"damage":[]}}'
+        self.assertEqual([1, 3, 12, 80], read_field(frame, "turnInfo"))
+        self.assertEqual([[[13, 27], 1.0, 3, "77", 2]], read_field(frame, "events.breach"))
+        self.assertEqual([], read_field(frame, "events.damage"))
+        self.assertIsNone(read_field(frame, "events.spawn"))
+        reader = FrameReader(["events.breach", "events.damage"])
+        self.assertEqual({"events.breach": json.loads(frame)["events"]["breach"]}, reader.read(frame), "Only non-empty fields are returned")
+
+        board = json.loads(frame)
+        del board["events"]
+        board["p1Units"] = board["p2Stats"] = None
+        self.assertEqual(board, read_board(frame))
+
+    def test_idle_compute(self):
+        class IdleAlgo(AlgoCore):
+            def on_idle_compute(self, cancel):
+                self.started = True
+                cancel.wait()
+                self.cancelled = cancel.is_set()
+
+        algo = IdleAlgo()
+        algo._start_idle_compute()
+        algo._stop_idle_compute()
+        self.assertTrue(algo.started and algo.cancelled, "on_idle_compute was not run and cancelled")
+        self.assertIsNone(algo._idle_thread)
+        self.assertFalse(AlgoCore()._idle_compute_enabled(), "Idle compute should be opt in")
+
+        class StuckAlgo(AlgoCore):
+            def on_idle_compute(self, cancel):
+                self.runs = getattr(self, "runs", 0) + 1
+                release.wait()
+
+        release = threading.Event()
+        algo = StuckAlgo()
+        algo.config = {"timingAndReplay": {"waitTimeBotSoft": 100}}
+        with mock.patch("gamelib.algocore.debug_write") as debug_write:
+            algo._start_idle_compute()
+            began = time.perf_counter()
+            algo._stop_idle_compute()
+            self.assertLess(time.perf_counter() - began, 1.0, "The turn waited for an on_idle_compute that ignores cancel")
+            algo._start_idle_compute()
+            self.assertEqual(1, algo.runs, "on_idle_compute was started again while still running")
+            self.assertEqual(2, debug_write.call_count)
+        release.set()
+        algo._stale_idle_thread.join()
+        algo._start_idle_compute()
+        algo._stop_idle_compute()
+        self.assertEqual(2, algo.runs)
+
+    def test_last_action_board(self):
+        class BoardAlgo(AlgoCore):
+            def on_turn(self, game_state):
+                with mock.patch("gamelib.algocore.read_board", side_effect=AssertionError("The board was decoded during on_turn")):
+                    self.board = self.get_last_action_board()
+
+        frames = ['{"turnInfo":[0,0,-1,0]}',
+                  '{"turnInfo":[1,0,0,1],"p1Stats":[30,0,5,0],"p2Stats":[30,0,5,0],"p1Units":[[]],"p2Units":[[]],"events":{"spawn":[]}}',
+                  '{"turnInfo":[1,0,1,2],"p1Stats":[29,0,5,0],"p2Stats":[30,0,5,0],"p1Units":[[]],"p2Units":[[]],"events":{"spawn":[]}}',
+                  '{"turnInfo":[0,1,-1,3]}',
+                  '{"turnInfo":[2,1,-1,3]}']
+        algo = BoardAlgo()
+        with mock.patch("gamelib.algocore.get_command", side_effect=frames), mock.patch("gamelib.algocore.debug_write"), \
+                mock.patch("gamelib.algocore.send_command"):
+            algo.start()
+        self.assertEqual(read_board(frames[2]), algo.board, "The board should be the last frame of the action phase")
+        self.assertNotIn("events", algo.board)
+
+    def test_game_end(self):
+        class EndingAlgo(AlgoCore):
+            def on_game_end(self):
+                self.ended = True
+
+        algo = EndingAlgo()
+        with mock.patch("gamelib.algocore.get_command", return_value='{"turnInfo":[2,10,-1,0]}'), mock.patch("gamelib.algocore.debug_write"):
+            algo.start()
+        self.assertTrue(algo.ended, "on_game_end was not called on the end state")
+
+    def test_turn_budget(self):
+        game = self.make_turn_0_map()
+        self.assertAlmostEqual(4.0, game.budget.limit, msg="Budget should be 80% of waitTimeBotSoft")
+        self.assertIn("parse", game.budget.spent)
+        game.find_path_to_edge([13, 0])
+        self.assertIn("pathing", game.budget.spent)
+
+        budget = TurnBudget(10)
+        best, score, evaluated = budget.best_first([1, 5, 3, 4], lambda batch: [-abs(c - 4) for c in batch], priority=lambda c: -c, batch_size=2)
+        self.assertEqual((4, 0, 4), (best, score, evaluated))
+        self.assertIn("simulation", budget.spent)
+        self.assertEqual((None, None, 0), TurnBudget(0).best_first([1, 2], lambda batch: batch), "An expired budget evaluates nothing")
+
+        phase = budget.slice(0.5)
+        self.assertAlmostEqual(budget.remaining() / 2, phase.limit, places=2)
+        self.assertFalse(TurnBudget(0).slice(0.5).limit, "A slice can't outlast its budget")
+        with phase.measure("phase"):
+            pass
+        self.assertIn("phase", budget.spent, "Time measured on a slice should count in the turn's budget")
 
     def _test_get_attackers(self):
         game = self.make_turn_0_map()
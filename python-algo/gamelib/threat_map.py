@@ -0,0 +1,77 @@
+from array import array
+from .geometry import ARENA_SIZE, locations_in_range
+
+
+class ThreatMap:
+    """Damage per frame that enemy structures can deal to a mobile unit on each location
+
+    threat[player_index][x * ARENA_SIZE + y] is the damage a mobile unit controlled by
+    player_index would take each frame at [x, y] if every enemy structure in range
+    targeted it. It is an upper bound, since a structure only shoots one target a frame.
+
+    GameState keeps one up to date as you spawn and upgrade structures, see GameState.get_threat_map.
+
+    Attributes :
+        * threat (list): Two flat arrays of damage per frame, one per defending player
+        * hit_radius (float): getHitRadius from the config, a structure reaches locations within attackRange + hit_radius
+
+    """
+    def __init__(self, game_map):
+        """Builds the map from every structure currently on the board
+
+        Args:
+            game_map: The GameMap to read structures from
+
+        """
+        self.threat = [array('d', [0.0]) * (ARENA_SIZE * ARENA_SIZE) for _ in range(2)]
+        self.hit_radius = game_map.config["unitInformation"][0].get("getHitRadius", 0.01)
+        for location in game_map:
+            for unit in game_map[location]:
+                if unit.stationary:
+                    self.add_unit(unit)
+
+    def add_unit(self, unit, sign=1):
+        """Adds the threat of a structure to every location it can attack
+
+        Args:
+            unit: A GameUnit
+            sign: -1 to take the threat away again instead
+
+        """
+        if not unit.stationary or unit.damage_i <= 0 or unit.attackRange <= 0:
+            return
+        threat = self.threat[1 - unit.player_index]
+        damage = sign * unit.damage_i
+        for x, y in locations_in_range(unit.x, unit.y, unit.attackRange, self.hit_radius):
+            threat[x * ARENA_SIZE + y] += damage
+
+    def remove_unit(self, unit):
+        """Takes away the threat of a structure, see add_unit"""
+        self.add_unit(unit, -1)
+
+    def get_threat(self, location, player_index):
+        """Gets the damage per frame a mobile unit would take at a location
+
+        Args:
+            location: The location of a hypothetical mobile unit
+            player_index: The player controlling the unit, 0 for you 1 for the enemy
+
+        Returns:
+            The damage per frame dealt by the enemy structures covering the location
+
+        """
+        return self.threat[player_index][location[0] * ARENA_SIZE + location[1]]
+
+    def path_damage(self, path, player_index):
+        """Sums the threat along a path, one frame per location
+
+        Args:
+            path: A list of locations, such as the one returned by find_path_to_edge
+            player_index: The player controlling the unit, 0 for you 1 for the enemy
+
+        Returns:
+            The total damage a unit following the path could take
+
+        """
+        threat = self.threat[player_index]
+        return sum(threat[x * ARENA_SIZE + y] for x, y in path)
@@ -0,0 +1,127 @@
+import time
+from contextlib import contextmanager
+
+# Share of the engine's soft time limit a turn plans to use, leaving room for sending the turn
+SAFETY_FRACTION = 0.8
+
+class TurnBudget:
+    """Tracks the time a turn has used against a deadline
+
+    GameState creates one per turn as game_state.budget, starting the clock before it
+    parses the turn string. Parsing and pathing are recorded automatically, wrap
+    anything else in measure to see where the turn went.
+
+    Attributes :
+        * limit (float): Seconds the turn may take
+        * start (float): time.perf_counter() when the turn started
+        * spent (dict): Seconds spent in each measured category, such as "parse", "pathing" and "simulation"
+
+    """
+    def __init__(self, limit, start=None):
+        """
+        Args:
+            limit: Seconds the turn may take
+            start: time.perf_counter() when the turn started, now if None
+
+        """
+        self.limit = limit
+        self.start = time.perf_counter() if start is None else start
+        self.spent = {}
+
+    @classmethod
+    def from_config(cls, config, start=None):
+        """Makes a budget of SAFETY_FRACTION of the soft time limit in config
+
+        Args:
+            config: A json object containing information about the game
+            start: time.perf_counter() when the turn started, now if None
+
+        """
+        soft_limit = config.get("timingAndReplay", {}).get("waitTimeBotSoft", 5000)
+        return cls(soft_limit / 1000 * SAFETY_FRACTION, start)
+
+    def elapsed(self):
+        """Seconds since the turn started"""
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        """Seconds left before the limit, never below 0"""
+        return max(0.0, self.limit - self.elapsed())
+
+    def expired(self):
+        return self.elapsed() >= self.limit
+
+    def slice(self, fraction):
+        """Sets aside a share of the time left for one phase of the turn
+
+        The slice starts now and gets fraction of the remaining time, so slicing each
+        phase in turn leaves the rest for the phases after it however long the earlier
+        ones take. Time measured on the slice is recorded in this budget's spent too.
+
+        Args:
+            fraction: Share of the remaining time, between 0 and 1
+
+        Returns:
+            A TurnBudget for the phase
+
+        """
+        phase = TurnBudget(self.remaining() * fraction)
+        phase.spent = self.spent
+        return phase
+
+    @contextmanager
+    def measure(self, category):
+        """Adds the time spent in a with block to a category
+
+        Nested blocks each count their own time, so a category measured inside
+        another is included in both.
+
+        Args:
+            category: The name to record the time under
+
+        """
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spent[category] = self.spent.get(category, 0.0) + time.perf_counter() - began
+
+    def best_first(self, candidates, evaluate, priority=None, batch_size=1, category="simulation"):
+        """Evaluates candidates in order of priority until the time runs out, keeping the best
+
+        An anytime search: the most promising candidates are evaluated first, and a batch is
+        only started if the batches so far suggest it will finish in the remaining time, so
+        the best result found so far is always ready to submit.
+
+        Args:
+            candidates: The options to choose between, for example simulation tests
+            evaluate: Takes a list of up to batch_size candidates and returns a list with a score for each, higher is better
+            priority: Cheap estimate of a candidate's score, candidates are evaluated highest first. In the given order if None
+            batch_size: Number of candidates passed to each evaluate call, for example one per simulation worker
+            category: The category the evaluation time is recorded under
+
+        Returns:
+            (best candidate, its score, number of candidates evaluated). The best candidate is None if none were evaluated.
+
+        """
+        if priority is not None:
+            candidates = sorted(candidates, key=priority, reverse=True)
+        best, best_score, evaluated = None, None, 0
+        slowest = 0.0
+        for i in range(0, len(candidates), batch_size):
+            if self.remaining() <= slowest:
+                break
+            batch = candidates[i:i + batch_size]
+            began = time.perf_counter()
+            with self.measure(category):
+                scores = evaluate(batch)
+            slowest = max(slowest, time.perf_counter() - began)
+            for candidate, score in zip(batch, scores):
+                if best_score is None or score > best_score:
+                    best, best_score = candidate, score
+            evaluated += len(batch)
+        return best, best_score, evaluated
+
+    def __str__(self):
+        spent = ", ".join("{} {:.1f}ms".format(category, seconds * 1000) for category, seconds in self.spent.items())
+        return "Turn time {:.1f}ms of {:.0f}ms ({})".format(self.elapsed() * 1000, self.limit * 1000, spent)
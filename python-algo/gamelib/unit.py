@@ -9,6 +9,68 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+# (config, {unit_type: template}) for the last config templates were built from
+_template_cache = (None, None)
+
+def unit_templates(config):
+    """Gets the attributes every new unit of each type starts with
+
+    Built once per config and reused by every GameUnit after that. Call it from
+    on_game_start so no turn pays for building them.
+
+    Args:
+        config: A json object containing information about the game
+
+    Returns:
+        A dict from unit type to a dict of GameUnit attributes. Shared, do not modify.
+    """
+    global _template_cache
+    if _template_cache[0] is config:
+        return _template_cache[1]
+
+    templates = {}
+    for type_config in config["unitInformation"]:
+        templates[type_config["shorthand"]] = {
+            "unit_type": type_config["shorthand"],
+            "config": config,
+            "pending_removal": False,
+            "upgraded": False,
+            "stationary": type_config.get("unitCategory") == 0,
+            "speed": type_config.get("speed", 0),
+            "damage_f": type_config.get("attackDamageTower", 0),
+            "damage_i": type_config.get("attackDamageWalker", 0),
+            "attackRange": type_config.get("attackRange", 0),
+            "shieldRange": type_config.get("shieldRange", 0),
+            "max_health": type_config.get("startHealth", 0),
+            "shieldPerUnit": type_config.get("shieldPerUnit", 0),
+            "shieldBonusPerY": type_config.get("shieldBonusPerY", 0),
+            "cost": (type_config.get("cost1", 0), type_config.get("cost2", 0)),
+            "_upgrade_config": type_config.get("upgrade", {}),
+        }
+    _template_cache = (config, templates)
+    return templates
+
+
+def build_unit(template, player_index, health, x, y):
+    """Creates a GameUnit straight from a template from unit_templates, skipping the config lookups
+
+    Args:
+        template: The template of the unit's type
+        player_index, health, x, y: As for GameUnit
+
+    Returns:
+        The new GameUnit
+    """
+    unit = GameUnit.__new__(GameUnit)
+    unit.__dict__.update(template)
+    unit.cost = list(template["cost"])
+    unit.player_index = player_index
+    unit.x = x
+    unit.y = y
+    unit.health = health if health else template["max_health"]
+    return unit
+
+
 class GameUnit:
     """Holds information about a Unit. 
 
@@ -36,34 +98,15 @@ class GameUnit:
         """ Initialize unit variables using args passed
 
         """
-        self.unit_type = unit_type
-        self.config = config
+        self.__dict__.update(unit_templates(config)[unit_type])
+        self.cost = list(self.cost)
         self.player_index = player_index
-        self.pending_removal = False
-        self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
         self.health = self.max_health if not health else health
 
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
-
-
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
+        type_config = self._upgrade_config
         self.speed = type_config.get("speed", self.speed)
         self.damage_f = type_config.get("attackDamageTower", self.damage_f)
         self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
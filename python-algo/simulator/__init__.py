@@ -1 +1,12 @@
-# blank file to make this directory a package
\ No newline at end of file
+"""
+The simulator package runs a single action phase headlessly so an algo can
+score candidate deployments before submitting its turn
+"""
+
+from .main import Simulator
+from .parallel import ParallelSimulator
+from .search import AttackSearch, Deployment, opponent_attacks
+from .sim_game_state import SimGameState
+from .sim_game_map import SimGameMap
+
+__all__ = ["Simulator", "ParallelSimulator", "AttackSearch", "Deployment", "opponent_attacks", "SimGameState", "SimGameMap"]
@@ -1,65 +1,7 @@
-import json
-import pygame
-from .sim_game_state import SimGameState
+import importlib.util
 
+from .main import Simulator
 
-
-class Simulator:
-    def __init__(self, last_action_frame: json, test: json, using_pygame: bool = False) -> None:
-        self.last_action_frame = last_action_frame
-        self.test = test
-        self.game_state = SimGameState(self.last_action_frame, self.test)
-        self.using_pygame = using_pygame
-
-        if using_pygame:
-            self.pygame_init()
-
-    def pygame_init(self):
-        pygame.init()
-        self.screen = pygame.display.set_mode((700,900))
-        pygame.display.set_caption("Terminal Tower Defense")
-        
-        pygame.font.init()
-        self.font = pygame.font.SysFont('Comic Sans MS', 15)
-        self.clock = pygame.time.Clock()
-    
-    def run_simulation(self) -> list[str]:
-        running = True
-        run_full_round = False
-        run_single_frame = False
-        self.game_state.draw(self.screen, self.font)
-        while running:
-            # self.screen.fill((200, 200, 200))
-
-            p = pygame.key.get_pressed()
-            if p[pygame.K_SPACE]:
-                run_full_round = not run_full_round
-            if p[pygame.K_RIGHT]:
-                run_single_frame = True
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-
-            mx, my = pygame.mouse.get_pos()
-            x_index, y_index = (mx - 12)//25, 27 - (my - 50 - 12)//25
-            # print(x_index, y_index)
-            font = self.font.render(f"{x_index}, {y_index}", True, (255,255,255))
-            font_rect = font.get_rect(center=(750, 100))
-            self.screen.blit(font, font_rect) 
-            
-            if (run_full_round or run_single_frame) and not self.game_state.is_round_over():
-                self.game_state.run_frame()
-                self.game_state.draw(self.screen, self.font)
-                run_single_frame = False
-            
-            pygame.display.update()
-            self.clock.tick(10) #10 FPS, ie delay 100ms between frames
-
-        pygame.quit()
-        return self.game_state.get_results()
-    
-import os
 if __name__ == "__main__":
     obj = {
     "turnInfo": [1,2,57],
@@ -109,6 +51,8 @@ if __name__ == "__main__":
         "p2Units": [[],[],[],[],[],[],[],[]]
     }
 
-    sim = Simulator(obj, test, using_pygame=True)
+    # the window needs pygame, without it the round is run headless and only the results are printed
+    using_pygame = importlib.util.find_spec("pygame") is not None
+    sim = Simulator(obj, test, using_pygame=using_pygame)
     results = sim.run_simulation()
     print(results)
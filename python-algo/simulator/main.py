@@ -0,0 +1,70 @@
+import json
+from .sim_game_state import SimGameState
+
+
+# Format of test:
+        # {
+        #   "p1Units": [WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE],
+        #   "p2Units": [WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE]
+        # }
+class Simulator:
+    # safety net so a unit that never reaches an edge can't hang the algo
+    MAX_FRAMES = 1000
+
+    def __init__(self, last_action_frame: json, test: json = None, using_pygame: bool = False) -> None:
+        self.last_action_frame = last_action_frame
+        self.test = test
+        self._game_state = None
+        # the pygame view lives in simulator.render and is only imported when asked for
+        self.using_pygame = using_pygame
+
+    @property
+    def game_state(self) -> SimGameState:
+        """The last action frame with the test loaded, built on first use so run_batch never loads it"""
+        if self._game_state is None:
+            self._game_state = SimGameState(self.last_action_frame, self.test)
+        return self._game_state
+
+    def run(self) -> json:
+        """Runs the loaded test to the end of the round without drawing anything
+
+        Returns:
+            The board at the end of the round, in the same format as get_results
+        """
+        return self._run_headless(self.game_state)
+
+    def run_batch(self, tests: list[json]) -> list[json]:
+        """Runs every test against the last action frame without drawing anything
+
+        The last action frame is loaded once and each test runs on a fork of it,
+        so tests can't affect each other.
+
+        Args:
+            tests: A list of test deployments, each with "p1Units" and "p2Units"
+
+        Returns:
+            One result per test, in the same order as tests
+        """
+        base = SimGameState(self.last_action_frame)
+        results = []
+        for test in tests:
+            results.append(self._run_headless(base.fork(test)))
+        return results
+
+    def _run_headless(self, game_state: SimGameState) -> json:
+        while not game_state.is_round_over() and game_state.frame < self.MAX_FRAMES:
+            game_state.run_frame()
+        return game_state.get_results()
+
+    def run_simulation(self) -> json:
+        """Runs the loaded test, in a pygame window if using_pygame was set
+
+        Returns:
+            The board where the round stopped, in the same format as get_results
+        """
+        if not self.using_pygame:
+            return self.run()
+
+        from .render import Renderer
+        Renderer().run(self.game_state)
+        return self.game_state.get_results()
@@ -0,0 +1,95 @@
+import json
+import multiprocessing
+import os
+
+from gamelib.geometry import precompute_ranges
+from .game_configs import configs
+from .main import Simulator
+from .result_cache import ResultCache, frame_hash
+
+
+def _init_worker() -> None:
+    # build the range tables once per worker instead of on the first frame of every turn
+    precompute_ranges(configs)
+
+def _run_chunk(last_action_frame: str, tests: list[json]) -> list[json]:
+    return Simulator(json.loads(last_action_frame)).run_batch(tests)
+
+
+class ParallelSimulator:
+    """Spreads simulation tests across a pool of worker processes
+
+    The pool is started once, ideally in on_game_start, and reused every turn.
+    Each call sends the serialized last action frame once per worker together with
+    that worker's share of the tests, so parsing the frame happens once per worker.
+
+    With a single process (or a single test) everything runs in the calling process.
+
+    Results are cached by a hash of the frame and test (see result_cache), across
+    turns, so a deployment already simulated against an unchanged board is not run again.
+    """
+    def __init__(self, processes: int = None, cache_size: int = 4096) -> None:
+        self.processes = processes or os.cpu_count() or 1
+        # a cache_size of 0 turns caching off
+        self.cache = ResultCache(cache_size) if cache_size > 0 else None
+        self.pool = None
+        if self.processes > 1:
+            # fork lets workers inherit the already imported simulator, spawn is the fallback on Windows
+            method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+            self.pool = multiprocessing.get_context(method).Pool(self.processes, initializer=_init_worker)
+
+    def run_batch(self, last_action_frame: json, tests: list[json]) -> list[json]:
+        """Runs every test against the last action frame
+
+        Args:
+            last_action_frame: The frame to start from, either as a json string or already parsed
+            tests: A list of test deployments, each with "p1Units" and "p2Units"
+
+        Returns:
+            One result per test, in the same order as tests
+        """
+        if self.cache is None:
+            return self._run_batch(last_action_frame, tests)
+
+        # keep the string, if given one, for the pool so the frame is never serialized again
+        serialized = last_action_frame if isinstance(last_action_frame, str) else None
+        if serialized is not None:
+            last_action_frame = json.loads(serialized)
+        board_hash = frame_hash(last_action_frame)
+        keys = [ResultCache.key(board_hash, test) for test in tests]
+        results = [self.cache.get(key) for key in keys]
+
+        # run each missing test once, even if it appears more than once in tests
+        missing = {}
+        for key, test, result in zip(keys, tests, results):
+            if result is None:
+                missing.setdefault(key, test)
+        if missing:
+            for key, result in zip(missing, self._run_batch(last_action_frame, list(missing.values()), serialized)):
+                self.cache.put(key, result)
+            # repeated tests each get their own copy
+            results = [self.cache.get(key) if result is None else result for key, result in zip(keys, results)]
+        return results
+
+    def _run_batch(self, last_action_frame: json, tests: list[json], serialized: str = None) -> list[json]:
+        """Runs tests without the cache. serialized, if given, is last_action_frame as a json string"""
+        if self.pool is None or len(tests) < 2:
+            if isinstance(last_action_frame, str):
+                last_action_frame = json.loads(last_action_frame)
+            return Simulator(last_action_frame).run_batch(tests)
+
+        if serialized is None:
+            serialized = last_action_frame if isinstance(last_action_frame, str) else json.dumps(last_action_frame)
+
+        # contiguous chunks keep the results in test order when concatenated
+        chunk_count = min(self.processes, len(tests))
+        chunk_size = -(-len(tests) // chunk_count)
+        chunks = [tests[i:i + chunk_size] for i in range(0, len(tests), chunk_size)]
+        results = self.pool.starmap(_run_chunk, [(serialized, chunk) for chunk in chunks])
+        return [result for chunk_results in results for result in chunk_results]
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
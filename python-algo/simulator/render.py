@@ -0,0 +1,107 @@
+"""
+Optional pygame view of a simulated round, used by `python -m simulator`.
+
+Nothing else in the simulator imports this module, so algos never pay for
+pygame (or need it installed) unless they ask for the view.
+"""
+import pygame
+
+from .constants import UnitType
+from .sim_game_map import SimGameMap
+from .sim_game_state import SimGameState
+from .sim_unit import SimUnit, SimSupport, SimWalkerStack, UNIT_STATS
+
+
+def tile_center(x: int, y: int) -> tuple[int, int]:
+    return (12 + x*25, 50 + 12 + (27-y)*25)
+
+def color_by_health(unit: SimUnit, color: tuple[int, int, int] = (255,255,255), health: float = None) -> tuple[int, int, int]:
+    scaling_factor = (health or unit.health) / UNIT_STATS[unit.unit_type].start_health
+    scaling_factor = max(0, min(1, scaling_factor))
+    return (int(color[0]*scaling_factor), int(color[1]*scaling_factor), int(color[2]*scaling_factor))
+
+def draw_upgraded(xy: tuple[int, int], screen: "pygame.Surface"):
+    pygame.draw.circle(screen, (255, 255, 0), tile_center(*xy), 4)
+    pygame.draw.circle(screen, (0, 0, 0), tile_center(*xy), 4, 1) #outline
+
+def draw_map(game_map: SimGameMap, screen: "pygame.Surface") -> None:
+    rect = pygame.Rect(0, 50, 700, 700)
+    pygame.draw.rect(screen, (0,0,0), rect)
+    for y in range(game_map.ARENA_SIZE):
+        for x in range(game_map.ARENA_SIZE):
+            if game_map.is_in_bounds(x, y):
+                color = (255, 0, 0) if y < game_map.HALF_ARENA else (0, 255, 255)
+            else:
+                color = (0, 0, 0)
+
+            pygame.draw.circle(screen, color, (12 + x*25, 50 + 12 + y*25), 2)
+
+def draw_unit(unit: SimUnit, screen: "pygame.Surface") -> None:
+    center = tile_center(unit.x, unit.y)
+    if isinstance(unit, SimWalkerStack):
+        pygame.draw.circle(screen, color_by_health(unit, (0, 255, 0), unit.health[-1]), center, 10)
+        return
+
+    if isinstance(unit, SimSupport):
+        pygame.draw.circle(screen, color_by_health(unit), center, 10)
+    else:
+        size = 10 if unit.unit_type == UnitType.WALL else 20
+        rect = pygame.Rect(0, 0, size, size)
+        rect.center = center
+        pygame.draw.rect(screen, color_by_health(unit), rect)
+    if unit.upgraded:
+        draw_upgraded((unit.x, unit.y), screen)
+
+def draw_state(game_state: SimGameState, screen: "pygame.Surface") -> None:
+    draw_map(game_state.game_map, screen)
+    for unit in game_state.all_units:
+        draw_unit(unit, screen)
+
+
+class Renderer:
+    """A window that steps through a simulated round
+
+    Space toggles running the whole round, the right arrow key runs a single frame.
+    """
+    def __init__(self) -> None:
+        pygame.init()
+        self.screen = pygame.display.set_mode((700,900))
+        pygame.display.set_caption("Terminal Tower Defense")
+
+        pygame.font.init()
+        self.font = pygame.font.SysFont('Comic Sans MS', 15)
+        self.clock = pygame.time.Clock()
+
+    def run(self, game_state: SimGameState) -> SimGameState:
+        """Shows game_state until the window is closed, returning it in whatever frame it reached"""
+        running = True
+        run_full_round = False
+        run_single_frame = False
+        draw_state(game_state, self.screen)
+        while running:
+            p = pygame.key.get_pressed()
+            if p[pygame.K_SPACE]:
+                run_full_round = not run_full_round
+            if p[pygame.K_RIGHT]:
+                run_single_frame = True
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+
+            mx, my = pygame.mouse.get_pos()
+            x_index, y_index = (mx - 12)//25, 27 - (my - 50 - 12)//25
+            font = self.font.render(f"{x_index}, {y_index}", True, (255,255,255))
+            font_rect = font.get_rect(center=(750, 100))
+            self.screen.blit(font, font_rect)
+
+            if (run_full_round or run_single_frame) and not game_state.is_round_over():
+                game_state.run_frame()
+                draw_state(game_state, self.screen)
+                run_single_frame = False
+
+            pygame.display.update()
+            self.clock.tick(10) #10 FPS, ie delay 100ms between frames
+
+        pygame.quit()
+        return game_state
@@ -0,0 +1,92 @@
+"""
+Zobrist-style hashing of simulator inputs and an LRU cache of simulation results.
+
+Every (player, unit type, location) has a random 64 bit key. A unit entry's key is
+that key mixed with the unit's health, and a board's hash is the sum of its entries'
+keys (plus the player stats) modulo 2**64. A sum is used instead of the usual xor so
+that stacked mobile units, which repeat the same entry, don't cancel out. Since
+SimGameState loads the frame's units and the test's units as one list, the hash of a
+test run is simply frame_hash + deployment_hash.
+
+The 64 bit hash is the whole cache key, so looking a test up never serializes the
+frame or the test. Each entry key is mixed with a splitmix64 finalizer, so two different
+inputs only share a key by chance, about once in 2**64.
+"""
+import json
+import random
+from collections import OrderedDict
+
+from gamelib.geometry import ARENA_SIZE
+
+MASK = (1 << 64) - 1
+UNIT_TYPE_COUNT = 8
+
+_rng = random.Random(0x5EED)
+_UNIT_KEYS = [_rng.getrandbits(64) for _ in range(2 * UNIT_TYPE_COUNT * ARENA_SIZE * ARENA_SIZE)]
+_STAT_KEYS = [_rng.getrandbits(64) for _ in range(6)]
+
+
+def _value_key(key: int, value: float) -> int:
+    # hash() of a float is stable across processes. The splitmix64 finalizer spreads it over
+    # all 64 bits, so repeated entries of different healths can't cancel out the way scaling did
+    z = (key + hash(value)) & MASK
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & MASK
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & MASK
+    return z ^ (z >> 31)
+
+def units_hash(p1_units: list[list], p2_units: list[list]) -> int:
+    """Hashes the unit lists of a frame or test, in the [WALL, ..., UPGRADE] per player format"""
+    h = 0
+    for player_index, units in enumerate((p1_units, p2_units)):
+        for unit_type, entries in enumerate(units):
+            base = (player_index * UNIT_TYPE_COUNT + unit_type) * ARENA_SIZE * ARENA_SIZE
+            for entry in entries:
+                h += _value_key(_UNIT_KEYS[base + entry[0] * ARENA_SIZE + entry[1]], entry[2])
+    return h & MASK
+
+def frame_hash(frame: json) -> int:
+    """Hashes everything in a frame that the simulator reads: player health, SP, MP and units"""
+    h = units_hash(frame["p1Units"], frame["p2Units"])
+    for key, value in zip(_STAT_KEYS, frame["p1Stats"][:3] + frame["p2Stats"][:3]):
+        h += _value_key(key, value)
+    return h & MASK
+
+def deployment_hash(test: json) -> int:
+    return units_hash(test["p1Units"], test["p2Units"])
+
+
+class ResultCache:
+    """A bounded least recently used cache of simulation results, keyed by frame_hash + deployment_hash
+
+    Results are stored serialized and get returns a fresh copy each time, so callers
+    are free to change it.
+    """
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(board_hash: int, test: json) -> int:
+        """Gets the key of a test run from the frame_hash of its frame"""
+        return (board_hash + deployment_hash(test)) & MASK
+
+    def get(self, key: int) -> json:
+        """Gets a copy of the cached result for a key, or None"""
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results.move_to_end(key)
+        return json.loads(result)
+
+    def put(self, key: int, result: json) -> None:
+        self.results[key] = json.dumps(result)
+        self.results.move_to_end(key)
+        if len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.results)
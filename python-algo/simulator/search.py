@@ -0,0 +1,174 @@
+"""
+Search over attack deployments for the current turn.
+
+Candidates (unit type x edge cell x count split) are ranked by a cheap estimate
+from the GameState's threat map, and only the most promising are run through the
+simulator, for as long as the turn's budget allows. The search works for either
+player, so the opponent's attacks can be searched the same way to find the worst
+breach we could suffer this turn.
+"""
+import json
+from itertools import combinations
+
+from gamelib.unit import GameUnit
+
+# weight of each point of enemy structure health destroyed, relative to a point of enemy health
+STRUCTURE_WEIGHT = 0.01
+
+
+def score_result(board: json, result: json, player_index: int = 0) -> float:
+    """Scores a simulated round for the attacking player: enemy health lost plus STRUCTURE_WEIGHT per point of enemy structure health destroyed"""
+    defender = "p2" if player_index == 0 else "p1"
+    structure_health = lambda frame: sum(entry[2] for units in frame[defender + "Units"][:3] for entry in units)
+    health_lost = board[defender + "Stats"][0] - result[defender + "Stats"][0]
+    return health_lost + STRUCTURE_WEIGHT * (structure_health(board) - structure_health(result))
+
+
+class Deployment:
+    """One candidate attack, made of stacks of a unit type on the attacking player's edge cells
+
+    Attributes :
+        * groups (tuple): (unit type, [x, y], count) for each stack
+        * player_index (int): The attacking player, 0 for us 1 for the enemy
+        * estimate (float): Breach damage expected from the threat map, used to decide what to simulate
+        * score (float): score_result of the simulated round, None if it was not simulated
+        * result (json): The simulated board at the end of the round, None if it was not simulated
+    """
+    __slots__ = ("groups", "player_index", "estimate", "score", "result")
+
+    def __init__(self, groups: tuple, estimate: float = 0.0, player_index: int = 0) -> None:
+        self.groups = groups
+        self.player_index = player_index
+        self.estimate = estimate
+        self.score = None
+        self.result = None
+
+    def to_test(self, config: json) -> json:
+        """Gets the deployment as a simulator test, see Simulator"""
+        shorthands = [unit["shorthand"] for unit in config["unitInformation"]]
+        test = {"p1Units": [[] for _ in range(8)], "p2Units": [[] for _ in range(8)]}
+        units = test["p1Units" if self.player_index == 0 else "p2Units"]
+        for unit_type, (x, y), count in self.groups:
+            index = shorthands.index(unit_type)
+            health = config["unitInformation"][index].get("startHealth", 0)
+            units[index] += [[x, y, health, ""] for _ in range(count)]
+        return test
+
+    def spawn(self, game_state) -> int:
+        """Spawns the deployment in game_state, returning the number of units spawned. Only our own deployments can be spawned"""
+        if self.player_index != 0:
+            return 0
+        return sum(game_state.attempt_spawn(unit_type, location, count) for unit_type, location, count in self.groups)
+
+    def __repr__(self) -> str:
+        return "Deployment({}, player_index={}, estimate={}, score={})".format(list(self.groups), self.player_index, self.estimate, self.score)
+
+
+class AttackSearch:
+    """Finds the best attack to send this turn, or the opponent's most dangerous one
+
+    Attributes :
+        * game_state (GameState): The turn to attack in
+        * simulator (ParallelSimulator): Runs the candidates that are simulated
+        * board (json): The last action frame to simulate from, see AlgoCore.get_last_action_board. Nothing is simulated if None
+        * unit_types (list): The mobile unit types to try, scouts and demolishers by default
+        * split_cells (int): Number of best cells per unit type that are also tried in pairs, with the units split between them
+        * player_index (int): The attacking player, 0 for us 1 for the enemy
+    """
+    def __init__(self, game_state, simulator, board: json, unit_types: list = None, split_cells: int = 4, player_index: int = 0) -> None:
+        self.game_state = game_state
+        self.simulator = simulator
+        self.board = board
+        unit_information = game_state.config["unitInformation"]
+        self.unit_types = unit_types or [unit_information[3]["shorthand"], unit_information[4]["shorthand"]]
+        self.split_cells = split_cells
+        self.player_index = player_index
+
+    def candidates(self) -> list[Deployment]:
+        """Enumerates every candidate deployment the attacking player can afford, best estimate first"""
+        game_state = self.game_state
+        game_map = game_state.game_map
+        player_index = self.player_index
+        if player_index == 0:
+            starts = game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT)
+        else:
+            starts = game_map.get_edge_locations(game_map.TOP_LEFT) + game_map.get_edge_locations(game_map.TOP_RIGHT)
+        paths = game_state.paths_from_all_edges(starts)
+        threat_map = game_state.get_threat_map()
+        shorthands = [unit["shorthand"] for unit in game_state.config["unitInformation"]]
+
+        candidates = []
+        for unit_type in self.unit_types:
+            if player_index == 0:
+                count = int(game_state.number_affordable(unit_type))
+            else:
+                cost = game_state.type_cost(unit_type)[game_state.MP]
+                count = int(game_state.get_resource(game_state.MP, 1) // cost) if cost > 0 else 0
+            if count < 1:
+                continue
+            unit = GameUnit(unit_type, game_state.config)
+            breach_damage = game_state.config["unitInformation"][shorthands.index(unit_type)].get("playerBreachDamage", 1)
+
+            # damage each start's path would take, or None if the path doesn't reach the enemy edge
+            path_damage = {}
+            for start, path in zip(starts, paths):
+                if path and game_map.is_on_edge(path[-1], game_state.get_target_edge(start)):
+                    path_damage[tuple(start)] = threat_map.path_damage(path, player_index) / unit.speed
+
+            def estimate(start, stack_count):
+                damage = path_damage.get(tuple(start))
+                if damage is None:
+                    return 0.0
+                return max(0.0, stack_count - damage / unit.max_health) * breach_damage
+
+            singles = [Deployment(((unit_type, start, count),), estimate(start, count), player_index) for start in starts if tuple(start) in path_damage]
+            candidates += singles
+            if count < 2:
+                continue
+            singles.sort(key=lambda deployment: deployment.estimate, reverse=True)
+            first_count = count // 2
+            for a, b in combinations([single.groups[0][1] for single in singles[:self.split_cells]], 2):
+                groups = ((unit_type, a, first_count), (unit_type, b, count - first_count))
+                candidates.append(Deployment(groups, estimate(a, first_count) + estimate(b, count - first_count), player_index))
+
+        candidates.sort(key=lambda deployment: deployment.estimate, reverse=True)
+        return candidates
+
+    def run(self, budget=None, top_k: int = 16) -> list[Deployment]:
+        """Simulates the top_k candidates by estimate, best first, while the budget lasts
+
+        Args:
+            budget: A TurnBudget, simulation stops when it runs out. Every top_k candidate is simulated if None
+            top_k: The most candidates to simulate
+
+        Returns:
+            The simulated candidates ranked by score, followed by the rest ranked by estimate
+        """
+        candidates = self.candidates()
+        if self.board is None:
+            return candidates
+
+        def evaluate(batch: list[Deployment]) -> list[float]:
+            results = self.simulator.run_batch(self.board, [deployment.to_test(self.game_state.config) for deployment in batch])
+            for deployment, result in zip(batch, results):
+                deployment.result = result
+                deployment.score = score_result(self.board, result, self.player_index)
+            return [deployment.score for deployment in batch]
+
+        top = candidates[:top_k]
+        if budget is None:
+            evaluate(top)
+        else:
+            budget.best_first(top, evaluate, batch_size=getattr(self.simulator, "processes", 1))
+
+        simulated = sorted((deployment for deployment in top if deployment.score is not None), key=lambda deployment: deployment.score, reverse=True)
+        return simulated + [deployment for deployment in candidates if deployment.score is None]
+
+
+def opponent_attacks(game_state, simulator, board: json, budget=None, top_k: int = 16) -> list[Deployment]:
+    """Simulates the attacks the opponent can afford this turn, see AttackSearch.run
+
+    Returns:
+        The opponent's deployments, most damaging to us first, so the first is our worst case
+    """
+    return AttackSearch(game_state, simulator, board, player_index=1).run(budget, top_k)
@@ -1,15 +1,78 @@
 import math
-import pygame
+from array import array
+from bisect import insort
+from gamelib import geometry
+from gamelib.geometry import ARENA_SIZE, HALF_ARENA, IN_BOUNDS, EDGE_MASK, locations_in_range
+from gamelib.util import debug_write
 from .constants import MapEdges, UnitType
 from .sim_unit import *
 
+EMPTY = -1
+# unit_type values up to this one are structures
+TURRET_VALUE = UnitType.TURRET.value
+
+# MapEdges value -> the matching edge index in gamelib.geometry
+EDGE_INDEX = (geometry.TOP_LEFT, geometry.TOP_RIGHT, geometry.BOTTOM_LEFT, geometry.BOTTOM_RIGHT)
+# MapEdges value -> the edge's locations. Shared by every map, do not modify
+EDGES = tuple(geometry.EDGES[index] for index in EDGE_INDEX)
+
+def _serial(stack: SimWalkerStack) -> int:
+    return stack.serial
+
 class SimGameMap:
+    """The simulated board
+
+    self.map holds the unit object on each tile. Several walker stacks can share a tile,
+    so walkers[x * ARENA_SIZE + y] lists every stack on the tile, ordered by serial, and
+    self.map holds the first of them. Alongside it the map keeps flat typed arrays,
+    indexed by x * ARENA_SIZE + y, describing what is on each tile so that occupancy and
+    whole-board queries never have to touch the unit objects:
+
+        * owner: player index of the unit (of the first stack), -1 if empty
+        * unit_type: UnitType value of the unit (of the first stack), -1 if empty
+        * health: structure health, or health of the unit at the back of the first stack
+        * upgraded: 1 if the structure is upgraded
+        * stack_count: number of units on the tile, over every stack
+
+    unit_locations[player_index][unit_type] is the set of flat indices of the tiles
+    holding that player's units of that type, so a type's units are found without
+    scanning the board.
+
+    Anything that changes a unit in place (damage, shields, upgrades, stacking) must
+    call refresh so the arrays stay in sync.
+    """
     edges = MapEdges
-    ARENA_SIZE = 28
-    HALF_ARENA = 14
+    ARENA_SIZE = ARENA_SIZE
+    HALF_ARENA = HALF_ARENA
+    IN_BOUNDS = IN_BOUNDS
 
     def __init__(self) -> None:
         self.map = [[None for _ in range(self.ARENA_SIZE)] for _ in range(self.ARENA_SIZE)]
+        self.walkers = {}
+        # bumped whenever a structure is added or removed so path caches know to rebuild
+        self.structure_version = 0
+
+        cells = self.ARENA_SIZE * self.ARENA_SIZE
+        self.owner = array('b', [EMPTY]) * cells
+        self.unit_type = array('b', [EMPTY]) * cells
+        self.health = array('d', [0.0]) * cells
+        self.upgraded = array('b', [0]) * cells
+        self.stack_count = array('H', [0]) * cells
+        self.unit_locations = [[set() for _ in UnitType] for _ in range(2)]
+
+    def fork(self) -> "SimGameMap":
+        """A copy of the map that can be changed without affecting this one. Units are not copied"""
+        branch = SimGameMap.__new__(SimGameMap)
+        branch.map = [column[:] for column in self.map]
+        branch.walkers = {i: list(stacks) for i, stacks in self.walkers.items()}
+        branch.structure_version = self.structure_version
+        branch.owner = self.owner[:]
+        branch.unit_type = self.unit_type[:]
+        branch.health = self.health[:]
+        branch.upgraded = self.upgraded[:]
+        branch.stack_count = self.stack_count[:]
+        branch.unit_locations = [[set(locations) for locations in player] for player in self.unit_locations]
+        return branch
 
     def __getitem__(self, key: tuple[int, int]) -> SimUnit | None:
         return self.map[key[0]][key[1]]
@@ -17,23 +80,11 @@ class SimGameMap:
     def __setitem__(self, key: tuple[int, int], unit: SimUnit) -> None:
         self.map[key[0]][key[1]] = unit
 
-    def draw(self, screen: pygame.display, font: pygame.font.Font) -> None:
-        rect = pygame.Rect(0, 50, 700, 700)
-        pygame.draw.rect(screen, (0,0,0), rect)
-        for y in range(self.ARENA_SIZE):
-            for x in range(self.ARENA_SIZE):
-                if self.is_in_bounds(x, y):
-                    color = (255, 0, 0) if y < self.HALF_ARENA else (0, 255, 255)
-                else:
-                    color = (0, 0, 0)
-                
-                pygame.draw.circle(screen, color, (12 + x*25, 50 + 12 + y*25), 2)
-    
     def contains_stationary_unit(self, xy: tuple[int, int]) -> bool:
         """
         Checks if given location contains a stationary unit (WALL, TURRET, SUPPORT)
         """
-        return type(self[xy]) in [SimUnit, SimSupport]
+        return 0 <= self.unit_type[xy[0] * self.ARENA_SIZE + xy[1]] <= UnitType.TURRET.value
 
     def is_in_bounds(self, x: int, y: int) -> bool:
         """Checks if the given location is inside the diamond shaped game board.
@@ -45,19 +96,9 @@ class SimGameMap:
             True if the location is on the board, False otherwise
         
         """
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        if x < 0 or y < 0 or x >= self.ARENA_SIZE or y >= self.ARENA_SIZE:
+            return False
+        return self.IN_BOUNDS[x * self.ARENA_SIZE + y] == 1
 
     def get_quadrant(self, x: int, y: int) -> MapEdges:
         """"
@@ -72,39 +113,24 @@ class SimGameMap:
         if x < self.ARENA_SIZE // 2 and y >= self.ARENA_SIZE // 2:
             return self.edges.TOP_LEFT
 
-    def get_edge_locations(self, quadrant: MapEdges) -> list[tuple[int, int]]:
-        return self.get_edges()[quadrant.value]
+    def get_edge_locations(self, quadrant: MapEdges) -> tuple[tuple[int, int], ...]:
+        return EDGES[quadrant.value]
 
-    def get_edges(self) -> list[list[tuple[int, int]]]:
+    def get_edges(self) -> tuple[tuple[tuple[int, int], ...], ...]:
 
         """Gets all of the edges and their edge locations
 
         Returns:
-            A list with four lists inside of it of locations corresponding to the four edges.
-            [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
+            A tuple with four tuples inside of it of locations corresponding to the four edges.
+            [0] = top_left, [1] = top_right, [2] = bottom_left, [3] = bottom_right.
         """
-        # assume 0,0 is bottom left
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_left, top_right, bottom_left, bottom_right]
+        return EDGES
+
+    def is_on_edge(self, x: int, y: int, quadrant: MapEdges) -> bool:
+        """Checks if a location lies on the given edge with a single table lookup"""
+        if x < 0 or y < 0 or x >= self.ARENA_SIZE or y >= self.ARENA_SIZE:
+            return False
+        return EDGE_MASK[x * self.ARENA_SIZE + y] >> EDGE_INDEX[quadrant.value] & 1 == 1
     
     def distance_between_locations(self, location_1: tuple[int, int], location_2: tuple[int, int]) -> float:
         """Euclidean distance
@@ -134,14 +160,155 @@ class SimGameMap:
         return min_distance
     
     def add_unit(self, xy: tuple[int, int], unit: SimUnit | SimSupport | SimWalkerStack) -> None:
-        self[xy] = unit
+        if isinstance(unit, SimWalkerStack):
+            self._put_walker(unit, xy[0], xy[1])
+        else:
+            self.structure_version += 1
+            self[xy] = unit
+        self.refresh(xy)
 
-    def remove_unit(self, x, y) -> None:
+    def remove_unit(self, x, y, unit: SimUnit = None) -> None:
+        """Removes the unit on a tile. With several walker stacks on the tile, pass unit to remove only that stack"""
         if not self.is_in_bounds(x, y):
             return
-        self[x,y] = None
+        if isinstance(unit, SimWalkerStack):
+            self._take_walker(unit)
+        else:
+            if self.contains_stationary_unit((x, y)):
+                self.structure_version += 1
+            self[x,y] = None
+            for stack in self.walkers.pop(x * self.ARENA_SIZE + y, ()):
+                self.unit_locations[stack.player_index][stack.unit_type.value].discard(x * self.ARENA_SIZE + y)
+        self.refresh((x, y))
+
+    def replace_unit(self, unit: SimUnit, replacement: SimUnit) -> None:
+        """Puts replacement, a copy of unit, in unit's place on the map"""
+        if isinstance(unit, SimWalkerStack):
+            stacks = self.walkers.get(unit.x * self.ARENA_SIZE + unit.y, [])
+            for index, stack in enumerate(stacks):
+                if stack is unit:
+                    stacks[index] = replacement
+        if self[unit.x, unit.y] is unit:
+            self[unit.x, unit.y] = replacement
+
+    def find_stack(self, xy: tuple[int, int], unit_type: UnitType, player_index: int) -> SimWalkerStack | None:
+        """Gets the stack of the given type and player on a tile, if there is one"""
+        for stack in self.walkers.get(xy[0] * self.ARENA_SIZE + xy[1], ()):
+            if stack.unit_type == unit_type and stack.player_index == player_index:
+                return stack
+        return None
 
-    def get_locations_in_range(self, location: tuple[int, int], radius: float) -> list[tuple[int, int]]:
+    def _put_walker(self, unit: SimWalkerStack, x: int, y: int) -> None:
+        unit.x, unit.y = x, y
+        i = x * self.ARENA_SIZE + y
+        stacks = self.walkers.setdefault(i, [])
+        insort(stacks, unit, key=_serial)
+        self.map[x][y] = stacks[0]
+        self.unit_locations[unit.player_index][unit.unit_type.value].add(i)
+
+    def _take_walker(self, unit: SimWalkerStack) -> bool:
+        i = unit.x * self.ARENA_SIZE + unit.y
+        stacks = self.walkers.get(i, [])
+        for index, stack in enumerate(stacks):
+            if stack is unit:
+                del stacks[index]
+                break
+        else:
+            return False
+        if not any(stack.unit_type is unit.unit_type and stack.player_index == unit.player_index for stack in stacks):
+            self.unit_locations[unit.player_index][unit.unit_type.value].discard(i)
+        if not stacks:
+            del self.walkers[i]
+        self.map[unit.x][unit.y] = stacks[0] if stacks else None
+        return True
+
+    def move_walkers(self, leaving: list[SimWalkerStack], moves: list[tuple[SimWalkerStack, tuple[int, int]]]) -> None:
+        """Moves walker stacks in one pass, as if each had been removed and re-added in turn
+
+        Every leaving or moving stack is first taken off its tile, then each moving stack
+        is placed on its new tile, alongside any stacks already there. The occupancy
+        arrays are refreshed once per touched tile.
+
+        Args:
+            leaving: Stacks that leave the board
+            moves: (stack, new location) for each stack that steps
+        """
+        touched = set()
+        for unit in leaving:
+            if self._take_walker(unit):
+                touched.add((unit.x, unit.y))
+        for unit, _ in moves:
+            if self._take_walker(unit):
+                touched.add((unit.x, unit.y))
+        for unit, (x, y) in moves:
+            self._put_walker(unit, x, y)
+            touched.add((x, y))
+        for xy in touched:
+            self.refresh(xy)
+
+    def refresh(self, xy: tuple[int, int]) -> None:
+        """Copies the state of the units on a tile into the occupancy arrays"""
+        i = xy[0] * self.ARENA_SIZE + xy[1]
+        unit = self[xy]
+        # walker stacks are added to and removed from unit_locations as they move
+        if self.owner[i] != EMPTY and self.unit_type[i] <= TURRET_VALUE:
+            self.unit_locations[self.owner[i]][self.unit_type[i]].discard(i)
+        if unit is None:
+            self.owner[i] = EMPTY
+            self.unit_type[i] = EMPTY
+            self.health[i] = 0.0
+            self.upgraded[i] = 0
+            self.stack_count[i] = 0
+            return
+
+        type_value = unit.unit_type.value
+        self.owner[i] = unit.player_index
+        self.unit_type[i] = type_value
+        self.upgraded[i] = unit.upgraded
+        if type_value > TURRET_VALUE:
+            self.health[i] = unit.health[-1] if unit.health else 0.0
+            stacks = self.walkers[i]
+            self.stack_count[i] = len(unit.health) if len(stacks) == 1 else sum(len(stack.health) for stack in stacks)
+        else:
+            self.unit_locations[unit.player_index][type_value].add(i)
+            self.health[i] = unit.health
+            self.stack_count[i] = 1
+
+    def get_unit_locations(self, unit_type: UnitType, player_index: int) -> list[tuple[int, int]]:
+        """All tiles holding a unit of the given type owned by the given player"""
+        size = self.ARENA_SIZE
+        return [(i // size, i % size) for i in sorted(self.unit_locations[player_index][unit_type.value])]
+
+    def get_turrets_in_range(self, locations: list[tuple[int, int]], player_index: int) -> list[tuple[int, int]]:
+        """Finds every enemy turret that can shoot at any of the given locations
+
+        The locations are marked on a flat mask once, then each enemy turret, found
+        through unit_locations, tests its precomputed range table against the mask.
+
+        Args:
+            locations: The tiles a unit controlled by player_index could stand on
+            player_index: The defending player
+
+        Returns:
+            The locations of the enemy turrets covering at least one of the tiles
+        """
+        getHitRadius = 0.01 #from the configs
+        size = self.ARENA_SIZE
+        marked = bytearray(size * size)
+        for x, y in locations:
+            if self.is_in_bounds(x, y):
+                marked[x * size + y] = 1
+        turrets = []
+        for i in sorted(self.unit_locations[1 - player_index][TURRET_VALUE]):
+            tx, ty = divmod(i, size)
+            stats = UPGRADED_UNIT_STATS[UnitType.TURRET] if self.upgraded[i] else UNIT_STATS[UnitType.TURRET]
+            for x, y in locations_in_range(tx, ty, stats.attack_range, getHitRadius):
+                if marked[x * size + y]:
+                    turrets.append((tx, ty))
+                    break
+        return turrets
+
+    def get_locations_in_range(self, location: tuple[int, int], radius: float) -> tuple[tuple[int, int], ...]:
         """Gets locations in a circular area around a location
 
         Args:
@@ -149,89 +316,19 @@ class SimGameMap:
             radius: The radius of our search area
 
         Returns:
-            The locations that are within our search area
+            The locations that are within our search area, none if the radius or location is invalid
 
         """
         if radius < 0 or radius > self.ARENA_SIZE:
             self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
+            return ()
         if not self.is_in_bounds(location[0], location[1]):
-            self._invalid_coordinates(location)
+            self.warn("{} is out of bounds.".format(str(location)))
+            return ()
 
-        x, y = location
-        locations = []
-        search_radius = math.ceil(radius)
         getHitRadius = 0.01 #from the configs
-        for i in range(int(x - search_radius), int(x + search_radius + 1)):
-            for j in range(int(y - search_radius), int(y + search_radius + 1)):
-                new_location = (i, j)
-                # A unit with a given range affects all locations whose centers are within that range + get hit radius
-                if self.is_in_bounds(new_location[0], new_location[1]) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
-                    locations.append(new_location)
-        return locations
-    
-    def get_best_target(self, unit: SimUnit) -> SimUnit | None: 
-        visible_locations = self.get_locations_in_range((unit.x, unit.y), unit.attackRange)
-        if not visible_locations:
-            return None
-        
-        best_target_location = visible_locations[0]
-        for xy in visible_locations: 
-            # None or SimUnit/derived classes
-            target = self[xy]
-
-            # No unit at this location
-            if not target:
-                continue
-                
-            # Don't target your own units
-            if target.player_index == unit.player_index:
-                continue
-
-            # turret can not it stationary units
-            if unit.unit_type == UnitType.TURRET and target.unit_type in [UnitType.WALL, UnitType.TURRET, UnitType.SUPPORT]:
-                continue
-        
-            if target.unit_type in [UnitType.WALL, UnitType.TURRET, UnitType.SUPPORT]:
-                target_hp = target.health
-            else: 
-                target_hp =  0 if target.unit_count <= 0 else target.health[-1]
-        
-            # If we have nothing, settle for the first thing that is valid 
-            if not self[best_target_location] and target and target_hp > 0:
-                best_target_location = xy
-                continue
-
-            
-
-            # 1. Priority Targeting
-            # NOTE: This won't happen because we aren't simulating opponent walkers
-            # if best_target_location.unit_type in [WALL, SUPPORT, TURRET] and target.unit_type in [SCOUT, DEMOLISHER, INTERCEPTOR]:
-            #     best_target_location = tuple(target.x, target.y)
-            # 2. Distance Targeting
-            if self.distance_between_locations((unit.x, unit.y), xy) < self.distance_between_locations((unit.x, unit.y), best_target_location):
-                best_target_location = (target.x, target.y)
-                continue
-        
-            if self.distance_between_locations((unit.x, unit.y), xy) == self.distance_between_locations((unit.x, unit.y), best_target_location):
-                # 3. Health Targeting (make sure to not shoot a target that is already dead (not yet cleaned up!))
-                if self[best_target_location].unit_type in [UnitType.WALL, UnitType.TURRET, UnitType.SUPPORT]:
-                    best_target_hp = self[best_target_location].health
-                else:
-                    best_target_hp = 0 if self[best_target_location].unit_count <= 0 else self[best_target_location].health[-1]
-
-                # target hp is better than current best
-                if target_hp < best_target_hp and target_hp > 0:
-                    best_target_location = (target.x, target.y)
-                    continue
-
-                if target.health == best_target_hp:
-                    # 4. Furthest into Your Side (Assume your side is the bottom)
-                    if (unit.player_index == 0 and target.y < best_target_location[1]) or (unit.player_index == 1 and target.y > best_target_location[1]):
-                        best_target_location = (target.x, target.y)
-                        continue
-                    elif target.y == best_target_location[1]:
-                        # 5. Closest to an Edge
-                        if self.distance_to_closest_edge(target.x, target.y) < self.distance_to_closest_edge(best_target_location):
-                            best_target_location = (target.x, target.y)
-        return self[best_target_location]
-    
\ No newline at end of file
+        # A unit with a given range affects all locations whose centers are within that range + get hit radius
+        return locations_in_range(location[0], location[1], radius, getHitRadius)
+
+    def warn(self, message: str) -> None:
+        debug_write(message)
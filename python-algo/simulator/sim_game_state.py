@@ -1,7 +1,8 @@
+import copy
 import json
 
-import pygame
-from .sim_game_map import SimGameMap
+from gamelib.geometry import locations_with_distance
+from .sim_game_map import SimGameMap, EMPTY, TURRET_VALUE
 from .sim_navigation import SimShortestPathFinder
 from .constants import UnitType, MapEdges
 from .game_configs import configs
@@ -11,7 +12,7 @@ class SimGameState:
     STRUCTURES = [UnitType.WALL, UnitType.TURRET, UnitType.SUPPORT]
     WALKERS = [UnitType.SCOUT, UnitType.DEMOLISHER, UnitType.INTERCEPTOR]
 
-    def __init__(self, last_action_frame: json, test: json) -> None:
+    def __init__(self, last_action_frame: json, test: json = None) -> None:
         self.frame = -1
         self.p1_units = []
         self.p2_units = []
@@ -23,11 +24,22 @@ class SimGameState:
 
         self.game_map = SimGameMap()
         self.pathfinder = SimShortestPathFinder(self.game_map)
+        self.threat_index = None
+        self.threat_index_version = None
+        # units this state shares with states forked from it (or it was forked from)
+        self.shared_units = set()
+        # shield_cover[player][x * ARENA_SIZE + y] is the bitset of the shield_bit of that player's supports covering the tile
+        self.shield_cover = None
+        self.shield_amounts = {}
+        self.next_shield_bit = 1
+        self.next_walker_serial = 0
 
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
 
         self.parse_frame(last_action_frame)
+        if test is None:
+            test = {"p1Units": [[] for _ in range(8)], "p2Units": [[] for _ in range(8)]}
 
         # merge arrays of units
         p1_units = [a+b for a,b in zip(last_action_frame["p1Units"], test["p1Units"])]
@@ -80,13 +92,12 @@ class SimGameState:
             self.all_units.add(u)
         
         # Supports
-        print("p1", p1_units)
-        print("p2", p2_units)
         for entry in p1_units[1]:
             x = entry[0]
             y = entry[1]
             hp = entry[2]
-            u = SimSupport((x, y), 0, hp)
+            u = SimSupport((x, y), 0, hp, self.next_shield_bit)
+            self.next_shield_bit <<= 1
             self.game_map.add_unit((x, y), u)
             self.supports.add(u)
             self.all_units.add(u)
@@ -95,7 +106,8 @@ class SimGameState:
             x = entry[0]
             y = entry[1]
             hp = entry[2]
-            u = SimSupport((x, y), 1, hp)
+            u = SimSupport((x, y), 1, hp, self.next_shield_bit)
+            self.next_shield_bit <<= 1
             self.game_map.add_unit((x, y), u)
             self.supports.add(u)
             self.all_units.add(u)
@@ -124,35 +136,47 @@ class SimGameState:
             for entry in p1_units[i]:
                 x = entry[0]
                 y = entry[1]
-                unit = self.game_map[x, y]
+                unit = self.game_map.find_stack((x, y), UnitType(i), 0)
                 if not unit:
-                    u = SimWalkerStack(i, (x, y), 0, 1)
+                    u = SimWalkerStack(UnitType(i), (x, y), 0, 1, self.next_walker_serial)
+                    self.next_walker_serial += 1
                     self.game_map.add_unit((x, y), u)
                     self.fighters.add(u)
                     self.walker_stacks.add(u)
                     self.all_units.add(u)
                 else: 
-                    unit.add_to_stack()
+                    self.writable(unit).add_to_stack()
+                    self.game_map.refresh((x, y))
 
             for entry in p2_units[i]:
                 x = entry[0]
                 y = entry[1]
+                unit = self.game_map.find_stack((x, y), UnitType(i), 1)
                 if not unit:
-                    u = SimWalkerStack(i, (x, y), 1, 1)
+                    u = SimWalkerStack(UnitType(i), (x, y), 1, 1, self.next_walker_serial)
+                    self.next_walker_serial += 1
                     self.game_map.add_unit((x, y), u)
                     self.fighters.add(u)
                     self.walker_stacks.add(u)
                     self.all_units.add(u)
                 else: 
-                    unit.add_to_stack()
+                    self.writable(unit).add_to_stack()
+                    self.game_map.refresh((x, y))
                 
         # Upgrades
         for x, y, _, _ in p1_units[7]:
-            self.game_map[x, y].upgrade()
+            self.writable(self.game_map[x, y]).upgrade()
+            self.game_map.refresh((x, y))
 
         for x, y, _, _ in p2_units[7]:
-            print(f"UPGRADE: {x}, {y}")
-            self.game_map[x, y].upgrade()
+            self.writable(self.game_map[x, y]).upgrade()
+            self.game_map.refresh((x, y))
+
+        if p1_units[7] or p2_units[7]:
+            # upgraded turrets reach further, and the layout (so structure_version) is unchanged
+            self.threat_index_version = None
+
+        self.index_shields()
         
         # initialize paths for walker stacks
         for walker_stack in self.walker_stacks:
@@ -161,6 +185,89 @@ class SimGameState:
             path = self.pathfinder.navigate_multiple_endpoints(start_location, edge_squares)
             walker_stack.set_path(path)
         
+    def fork(self, test: json = None) -> "SimGameState":
+        """Creates a branch of this state that can be simulated independently
+
+        Structures are shared copy-on-write between the two states: a structure is only
+        copied by whichever state first damages or changes it. Walker stacks, which change
+        every frame, are copied straight away. The map arrays, player stats and
+        unit sets are copied, and the path finder and threat index caches are shared until
+        the structure layout of the branch changes.
+
+        Args:
+            test: Optional extra units to deploy on the branch, same format as in __init__
+
+        Returns:
+            The new state
+        """
+        branch = copy.copy(self)
+        branch.game_map = self.game_map.fork()
+        branch.pathfinder = self.pathfinder.fork(branch.game_map)
+        branch.player_stats = [dict(stats) for stats in self.player_stats]
+        branch.walker_stacks = set(self.walker_stacks)
+        branch.supports = set(self.supports)
+        branch.fighters = set(self.fighters)
+        branch.all_units = set(self.all_units)
+
+        for walker_stack in self.walker_stacks:
+            branch._replace_unit(walker_stack, walker_stack.copy())
+
+        structures = {unit for unit in self.all_units if unit.unit_type in self.STRUCTURES}
+        self.shared_units = set(structures)
+        branch.shared_units = set(structures)
+
+        if test is not None:
+            branch.load_units(test["p1Units"], test["p2Units"])
+        return branch
+
+    def writable(self, unit: SimUnit) -> SimUnit:
+        """Returns a version of unit that this state is free to modify, copying it if it is shared"""
+        if unit not in self.shared_units:
+            return unit
+        self.shared_units.discard(unit)
+        unit_copy = unit.copy()
+        self._replace_unit(unit, unit_copy)
+        return unit_copy
+
+    def _replace_unit(self, unit: SimUnit, replacement: SimUnit) -> None:
+        self.game_map.replace_unit(unit, replacement)
+        for units in [self.walker_stacks, self.supports, self.fighters, self.all_units]:
+            if unit in units:
+                units.remove(unit)
+                units.add(replacement)
+
+    def index_shields(self) -> None:
+        """Rebuilds shield_cover from the supports' coverage, whenever a support is placed, upgraded or destroyed
+
+        The lists are replaced rather than changed, so forked states can share them.
+        """
+        size = self.ARENA_SIZE * self.ARENA_SIZE
+        self.shield_cover = [[0] * size, [0] * size]
+        self.shield_amounts = {}
+        for support in self.supports:
+            cover = self.shield_cover[support.player_index]
+            bit = support.shield_bit
+            for i in support.coverage:
+                cover[i] |= bit
+            self.shield_amounts[bit] = support.shield_amount
+
+    def give_shields(self) -> None:
+        """Shields each walker stack with every support covering its tile that hasn't shielded it yet"""
+        size = self.ARENA_SIZE
+        amounts = self.shield_amounts
+        for walker_stack in self.walker_stacks:
+            pending = self.shield_cover[walker_stack.player_index][walker_stack.x * size + walker_stack.y] & ~walker_stack.shields
+            if not pending:
+                continue
+            walker_stack.shields |= pending
+            shield = 0
+            while pending:
+                bit = pending & -pending
+                shield += amounts[bit]
+                pending ^= bit
+            walker_stack.health = [health + shield for health in walker_stack.health]
+            self.game_map.refresh((walker_stack.x, walker_stack.y))
+
     def get_walkers(self) -> set:
         return self.walker_stacks
     
@@ -185,10 +292,14 @@ class SimGameState:
         p1_units = [[] for _ in range(8)]
         p2_units = [[] for _ in range(8)]
         for unit in self.all_units:
-            if unit.player_index == 0:
-                p1_units[unit.unit_type.value].append([unit.x, unit.y, unit.health[0], ""])
+            units = p1_units if unit.player_index == 0 else p2_units
+            if unit.unit_type in self.WALKERS:
+                for health in unit.health:
+                    units[unit.unit_type.value].append([unit.x, unit.y, health, ""])
             else:
-                p2_units[unit.unit_type.value].append([unit.x, unit.y, unit.health[0], ""])
+                units[unit.unit_type.value].append([unit.x, unit.y, unit.health, ""])
+                if unit.upgraded:
+                    units[UnitType.UPGRADE.value].append([unit.x, unit.y, 0, ""])
 
         res["p1Units"] = p1_units
         res["p2Units"] = p2_units
@@ -201,99 +312,151 @@ class SimGameState:
     def find_path_to_edge(self, xy: tuple[int, int], target_edge: MapEdges) -> list[tuple[int, int]]:
         pass
 
-    def draw(self, screen: pygame.display, font: pygame.font.Font) -> None:
-        # draw map
-        self.game_map.draw(screen, font)
-        # draw units
-        for unit in self.all_units:
-            unit.draw(screen, font)
-
     def run_frame(self) -> None:
         # all logic in a single loop iteration
         if self.is_round_over():
             return
         
         self.frame += 1
-        print(self.frame)
 
         # supports giving shields
-        for support in self.supports:
-            support_xy = support.x, support.y
-            shield_range = self.game_map.get_locations_in_range(support_xy, support.shield_range)
-
-            for xy in shield_range:
-                unit = self.game_map[xy] # either None, stationary unit or walker stack 
-                if unit and not self.contains_stationary_unit(xy):
-                    if unit.player_index == support.player_index and unit not in support.given_shield:
-                        support.given_shield.add(unit)
-                        unit.health = list(map(lambda x: x + support.shield_per_unit, unit.health))
-
-        # move walkers
-        have_moved = set()
+        if self.shield_amounts:
+            self.give_shields()
+
+        # move walkers: every stack due to step this frame advances its path cursor, then the map is updated in one pass
+        leaving = []
+        moves = []
         for walker_stack in self.walker_stacks:
-            if walker_stack in have_moved:
+            if not walker_stack.moves_on(self.frame):
                 continue
+            if walker_stack.has_next_step():
+                # Assumption that there will be no other units in the path.
+                moves.append((walker_stack, walker_stack.next_step()))
+            else:
+                leaving.append(walker_stack)
+        self.game_map.move_walkers(leaving, moves)
 
-            quadrant = self.game_map.get_quadrant(walker_stack.x, walker_stack.y)
-            if (walker_stack.x, walker_stack.y) in self.game_map.get_edge_locations(quadrant):
-                # remove walker_stack from map
-                self.game_map.remove_unit(walker_stack.x, walker_stack.y)
-                self.fighters.remove(walker_stack)
-                self.walker_stacks.remove(walker_stack)
-                self.all_units.remove(walker_stack)
-
-                # update resources
-                enemy_index = 1 if walker_stack.player_index == 0 else 0
-                damage = walker_stack.unit_count * (2 if walker_stack.unit_type == UnitType.DEMOLISHER else 1)
-                self.player_stats[enemy_index]["health"] -= damage
-                self.player_stats[walker_stack.player_index]["SP"] += damage
+        for walker_stack in leaving:
+            self.fighters.remove(walker_stack)
+            self.walker_stacks.remove(walker_stack)
+            self.all_units.remove(walker_stack)
+
+            # a stack whose path ends off its target edge self destructs instead of scoring
+            if not self.game_map.is_on_edge(walker_stack.x, walker_stack.y, walker_stack.target_edge):
                 continue
 
-            # move unit to next spot in path. 
-            # Assumption that there will be no other units in the path.
-            next_step = walker_stack.next_step()
-            walker_stack.x, walker_stack.y = next_step
-            self.game_map.remove_unit(walker_stack.x, walker_stack.y)
-            self.game_map.add_unit(next_step, walker_stack)
+            # update resources
+            enemy_index = 1 if walker_stack.player_index == 0 else 0
+            damage = walker_stack.unit_count * (2 if walker_stack.unit_type == UnitType.DEMOLISHER else 1)
+            self.player_stats[enemy_index]["health"] -= damage
+            self.player_stats[walker_stack.player_index]["SP"] += damage
 
         # attack
-        # units_to_remove = set()
-        # any_destoyed = False
-        # for fighter in self.get_fighters():
-        #     # all units in walker stack attack individually. Also works for turrets
-        #     for _ in range(fighter.unit_count):
-        #         target = self.game_map.get_best_target(fighter)
-        #         if not target:
-        #             continue
-                
-        #         target_health = target.inflict_damage(fighter.damage_structure if target.unit_type in self.STRUCTURES else fighter.damage_walker)
-        #         if target_health <= 0:
-        #             if target.unit_type in [UnitType.WALL, UnitType.TURRET, UnitType.SUPPORT]:
-        #                 any_destoyed = True
-        #                 units_to_remove.add(target)
-                    
-        #             elif target.unit_count <= 0: 
-        #                 units_to_remove.add(target)
-        
-        # if any_destoyed:
-        #     for walker_stack in self.walker_stacks:
-        #         if walker_stack in units_to_remove:
-        #             continue
-                
-        #         # can be optimized 
-        #         start_location = walker_stack.x, walker_stack.y
-        #         edge_squares = self.game_map.get_edge_locations(walker_stack.get_target_edge())
-        #         path = self.pathfinder.navigate_multiple_endpoints(start_location, edge_squares)
-        #         walker_stack.set_path(path)
+        units_to_remove = set()
+        for attacker in self.get_active_attackers():
+            # all units in walker stack attack individually. Also works for turrets
+            for _ in range(attacker.unit_count):
+                target = self.get_target(attacker)
+                if not target:
+                    break
 
+                target = self.writable(target)
+                target_health = target.inflict_damage(attacker.damage_structure if target.unit_type in self.STRUCTURES else attacker.damage_walker)
+                self.game_map.refresh((target.x, target.y))
+                if target_health <= 0 and (target.unit_type in self.STRUCTURES or target.unit_count <= 0):
+                    units_to_remove.add(target)
 
         # remove deleted units
-        # for unit in units_to_remove:
-        #     self.game_map.remove_unit(unit.x, unit.y)
-        #     self.all_units.remove(unit)
-        #     if unit.unit_type == UnitType.SUPPORT:
-        #         self.supports.remove(unit)
-        #     if unit.unit_type in [UnitType.TURRET, UnitType.SCOUT, UnitType.DEMOLISHER, UnitType.INTERCEPTOR]:
-        #         self.fighters.remove(unit)
-        #         if unit.unit_type != UnitType.TURRET:
-        #             self.walker_stacks.remove(unit)
+        any_destroyed = False
+        support_destroyed = False
+        for unit in units_to_remove:
+            if unit.unit_type in self.WALKERS or self.game_map[unit.x, unit.y] is unit:
+                self.game_map.remove_unit(unit.x, unit.y, unit)
+            self.all_units.discard(unit)
+            self.fighters.discard(unit)
+            self.supports.discard(unit)
+            self.walker_stacks.discard(unit)
+            any_destroyed = any_destroyed or unit.unit_type in self.STRUCTURES
+            support_destroyed = support_destroyed or unit.unit_type == UnitType.SUPPORT
+
+        if support_destroyed:
+            self.index_shields()
+
+        if any_destroyed:
+            # the path finder cache is keyed on the structure layout, so this only recomputes each edge once
+            for walker_stack in self.walker_stacks:
+                start_location = walker_stack.x, walker_stack.y
+                edge_squares = self.game_map.get_edge_locations(walker_stack.target_edge)
+                path = self.pathfinder.navigate_multiple_endpoints(start_location, edge_squares)
+                walker_stack.set_path(path)
+
+    def get_threat_index(self) -> list[list[tuple[int, int]]]:
+        """
+        Spatial index of the locations of the turrets covering each tile, indexed by x * ARENA_SIZE + y.
+        Rebuilt only when a structure is added or destroyed.
+        """
+        if self.threat_index_version != self.game_map.structure_version:
+            self.threat_index_version = self.game_map.structure_version
+            self.threat_index = [[] for _ in range(self.ARENA_SIZE * self.ARENA_SIZE)]
+            for fighter in self.fighters:
+                if fighter.unit_type != UnitType.TURRET:
+                    continue
+                for x, y in self.game_map.get_locations_in_range((fighter.x, fighter.y), fighter.attackRange):
+                    self.threat_index[x * self.ARENA_SIZE + y].append((fighter.x, fighter.y))
+        return self.threat_index
+
+    def get_active_attackers(self) -> list[SimUnit]:
+        """
+        Units that may have something to attack this frame: every walker stack, plus only
+        the turrets covering a tile that holds an enemy walker stack.
+        Sorted by owner, location and serial so results don't depend on set ordering.
+        """
+        threat_index = self.get_threat_index()
+        attackers = set(self.walker_stacks)
+        for walker_stack in self.walker_stacks:
+            for turret_location in threat_index[walker_stack.x * self.ARENA_SIZE + walker_stack.y]:
+                turret = self.game_map[turret_location]
+                if turret.player_index != walker_stack.player_index:
+                    attackers.add(turret)
+        return sorted(attackers, key=lambda unit: (unit.player_index, unit.unit_type.value, unit.x, unit.y, getattr(unit, "serial", 0)))
+
+    def get_target(self, attacker: SimUnit) -> SimUnit | None:
+        """Returns the unit the attacker would choose to shoot this frame
+
+        Same priorities as gamelib's GameState.get_target:
+            Mobile units > Nearest unit > Lowest health > Furthest into the attacker's side > Closest to an edge
+
+        Candidates are read from the map's occupancy arrays, so only tiles in range are visited.
+        Every walker stack on a tile is a candidate, the lowest serial winning ties.
+        """
+        size = self.ARENA_SIZE
+        owner = self.game_map.owner
+        unit_type = self.game_map.unit_type
+        health = self.game_map.health
+        walkers = self.game_map.walkers
+        y_sign = 1 if attacker.player_index == 0 else -1
+
+        best = None
+        best_key = None
+        for x, y, distance in locations_with_distance(attacker.x, attacker.y, attacker.attackRange):
+            i = x * size + y
+            if owner[i] == EMPTY:
+                continue
+
+            if unit_type[i] <= TURRET_VALUE:
+                if owner[i] == attacker.player_index or health[i] <= 0 or attacker.damage_structure == 0:
+                    continue
+                key = (True, distance, health[i], y_sign * y, -abs(self.HALF_ARENA - 0.5 - x))
+                if best_key is None or key < best_key:
+                    best_key = key
+                    best = self.game_map[x, y]
+            elif attacker.damage_walker != 0:
+                for stack in walkers[i]:
+                    if stack.player_index == attacker.player_index or not stack.health or stack.health[-1] <= 0:
+                        continue
+                    key = (False, distance, stack.health[-1], y_sign * y, -abs(self.HALF_ARENA - 0.5 - x))
+                    if best_key is None or key < best_key:
+                        best_key = key
+                        best = stack
+
+        return best
@@ -1,54 +1,71 @@
-import heapq
-import math
+import copy
 import sys
-import queue
+from collections import deque
+from .constants import UnitType
 from .sim_game_map import SimGameMap
 
-class Node:
-    """A path-finding node
-
-    Attributes :
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a structures at this node's location
-        * pathlength: The distance between this node and the target location
-
-    """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
-
 """
 This class helps with pathfinding. We guarantee the results will
 be accurate, but top players may want to write their own pathfinding
 code to maximise time efficiency
 """
 
-class Map:
-    def __init__(self):
-        self.map = [[Node() for x in range(28)] for y in range(28)]
-    def __getitem__(self, location):
-        return self.map[location[0]][location[1]]
 class SimShortestPathFinder:
     """Handles path-finding
 
+    The blocked grid, the pockets of pathable space and the distance field for each
+    target are cached between calls, and are only thrown away when a structure is
+    added to or removed from the map. Every walker stack heading for the same edge
+    therefore shares a single BFS until the structure layout changes.
+
+    Grids are flat lists indexed by x * ARENA_SIZE + y.
+
     Attributes :
         * HORIZONTAL (int): A constant representing a horizontal movement
         * VERTICAL (int): A constant representing a vertical movement
 
-        * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * sim_map_ref (:obj: SimGameMap): The map being pathed over
 
     """
     def __init__(self, sim_map_ref: SimGameMap):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.sim_map_ref = sim_map_ref
-        self.game_map = Map()
+        self.size = sim_map_ref.ARENA_SIZE
+        self.in_bounds = sim_map_ref.IN_BOUNDS
+        self.invalidate()
+
+    def fork(self, sim_map_ref: SimGameMap) -> "SimShortestPathFinder":
+        """
+        A path finder for a forked copy of our map. The caches are shared until either map's
+        structure layout changes, at which point that finder starts its own.
+        """
+        # build the caches first so they exist to be shared
+        self._refresh()
+        branch = copy.copy(self)
+        branch.sim_map_ref = sim_map_ref
+        return branch
+
+    def invalidate(self) -> None:
+        """Drops every cached grid. Called automatically when the structure layout changes"""
+        self.layout_version = None
+        self.blocked = None
+        self.pockets = None
+        self.ideal_tiles = {}
+        self.pathlengths = {}
+
+    def _refresh(self) -> None:
+        if self.layout_version == self.sim_map_ref.structure_version:
+            return
+        self.invalidate()
+        self.layout_version = self.sim_map_ref.structure_version
+
+        # Fill in walls
+        size = self.size
+        self.blocked = [0 <= t <= UnitType.TURRET.value for t in self.sim_map_ref.unit_type]
+        self.pockets = [-1] * (size * size)
 
-    def navigate_multiple_endpoints(self, start_point: tuple[int, int], end_points: list[tuple[int, int]]) -> queue.Queue[tuple[int, int]] | None:
+    def navigate_multiple_endpoints(self, start_point: tuple[int, int], end_points: list[tuple[int, int]]) -> list[list[int]] | None:
         """Finds the path a unit would take to reach a set of endpoints
 
         Args:
@@ -63,43 +80,68 @@ class SimShortestPathFinder:
         if self.sim_map_ref.contains_stationary_unit(start_point):
             return
 
-        #Fill in walls
-        for i in range(28):
-            for j in range(28):
-                if self.sim_map_ref.contains_stationary_unit((i,j)):
-                    self.game_map[i,j].blocked = True
+        self._refresh()
+        # the map's edge tables are already tuples of tuples, anything else is converted so it can key the caches
+        edge_key = end_points if type(end_points) is tuple else tuple((x, y) for x, y in end_points)
+
         #Do pathfinding
-        ideal_endpoints = self._idealness_search(start_point, end_points)
-        self._validate(ideal_endpoints, end_points)
-        return self._get_path(start_point, end_points)
+        pocket = self._get_pocket(start_point)
+        ideal_tile = self.ideal_tiles.get((pocket, edge_key))
+        if ideal_tile is None:
+            ideal_tile = self._idealness_search(start_point, edge_key)
+            self.ideal_tiles[pocket, edge_key] = ideal_tile
+
+        target_key = edge_key if ideal_tile in edge_key else ideal_tile
+        pathlength = self.pathlengths.get(target_key)
+        if pathlength is None:
+            pathlength = self._validate(ideal_tile, edge_key)
+            self.pathlengths[target_key] = pathlength
 
-    def _idealness_search(self, start: tuple[int, int], end_points):
+        return self._get_path(start_point, edge_key, pathlength)
+
+    def _get_pocket(self, start: tuple[int, int]) -> int:
         """
-        Finds the most ideal tile in our 'pocket' of pathable space. 
-        The edge if it is available, or the best self destruct location otherwise
+        Labels the pocket of pathable space around start, returning its id.
+        Tiles in the same pocket always share an ideal tile.
         """
-        current = queue.Queue()
-        current.put(start)
-        best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start].visited_idealness = True
-        most_ideal = start
-
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.sim_map_ref.is_in_bounds(neighbor[0], neighbor[1]) or self.game_map[neighbor[0],neighbor[1]].blocked:
-                    continue
-
+        size = self.size
+        start_index = start[0] * size + start[1]
+        if self.pockets[start_index] != -1:
+            return self.pockets[start_index]
+
+        pocket = start_index
+        self.pockets[start_index] = pocket
+        current = deque([start_index])
+        while current:
+            index = current.popleft()
+            for neighbor in self._get_neighbors((index // size, index % size)):
                 x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
-
-                if current_idealness > best_idealness:
-                    best_idealness = current_idealness
-                    most_ideal = neighbor
+                if x < 0 or y < 0 or x >= size or y >= size:
+                    continue
+                neighbor_index = x * size + y
+                if not self.in_bounds[neighbor_index] or self.blocked[neighbor_index] or self.pockets[neighbor_index] != -1:
+                    continue
+                self.pockets[neighbor_index] = pocket
+                current.append(neighbor_index)
+        return pocket
 
-                if not self.game_map[x,y].visited_idealness and not self.game_map[x,y].blocked:
-                    self.game_map[x,y].visited_idealness = True
-                    current.put(neighbor)
+    def _idealness_search(self, start, end_points):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space. 
+        The edge if it is available, or the best self destruct location otherwise
+        """
+        size = self.size
+        pocket = self.pockets[start[0] * size + start[1]]
+        best_idealness = -1
+        most_ideal = None
+        for index in range(size * size):
+            if self.pockets[index] != pocket:
+                continue
+            location = (index // size, index % size)
+            current_idealness = self._get_idealness(location, end_points)
+            if current_idealness > best_idealness:
+                best_idealness = current_idealness
+                most_ideal = location
 
         return most_ideal
 
@@ -152,43 +194,46 @@ class SimShortestPathFinder:
 
         return idealness
 
-    def _validate(self, ideal_tile, end_points):
-        """Breadth first search of the grid, setting the pathlengths of each node
+    def _is_pathable(self, x: int, y: int) -> bool:
+        """In the arena and not blocked by a structure"""
+        if x < 0 or y < 0 or x >= self.size or y >= self.size:
+            return False
+        index = x * self.size + y
+        return self.in_bounds[index] and not self.blocked[index]
+
+    def _validate(self, ideal_tile, end_points) -> list[int]:
+        """Breadth first search of the grid, returning the pathlength of each tile (-1 if unreachable)
 
         """
+        size = self.size
+        pathlength = [-1] * (size * size)
+
         #VALIDATION
         #Add our most ideal tiles to current
-        current = queue.Queue()
-        if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0],location[1]].pathlength = 0
-               self.game_map[location[0],location[1]].visited_validate = True
-        else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0],ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0],ideal_tile[1]].visited_validate = True
+        current = deque()
+        targets = end_points if ideal_tile in end_points else [ideal_tile]
+        for location in targets:
+            #Set current pathlength to 0
+            pathlength[location[0] * size + location[1]] = 0
+            if not self.blocked[location[0] * size + location[1]]:
+                current.append(location)
 
         #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0],current_location[1]]
+        while current:
+            current_location = current.popleft()
+            current_pathlength = pathlength[current_location[0] * size + current_location[1]]
             for neighbor in self._get_neighbors(current_location):
-                if not self.sim_map_ref.is_in_bounds(neighbor[0], neighbor[1]) or self.game_map[neighbor[0],neighbor[1]].blocked:
+                x, y = neighbor
+                if not self._is_pathable(x, y):
                     continue
 
-                neighbor_node = self.game_map[neighbor[0],neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
+                if pathlength[x * size + y] == -1:
+                    pathlength[x * size + y] = current_pathlength + 1
+                    current.append(neighbor)
 
-        #debug_write("Print after validate")
-        #self.print_map()
-        return
+        return pathlength
 
-    def _get_path(self, start_point, end_points):
+    def _get_path(self, start_point, end_points, pathlength):
         """Once all nodes are validated, and a target is found, the unit can path to its target
 
         """
@@ -197,10 +242,8 @@ class SimShortestPathFinder:
         current = start_point
         move_direction = 0
 
-        while not self.game_map[current[0],current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0],current[1]].pathlength))
-            next_move = self._choose_next_move(current, move_direction, end_points)
-            #debug_write(next_move)
+        while not pathlength[current[0] * self.size + current[1]] == 0:
+            next_move = self._choose_next_move(current, move_direction, end_points, pathlength)
 
             if current[0] == next_move[0]:
                 move_direction = self.VERTICAL
@@ -208,32 +251,28 @@ class SimShortestPathFinder:
                 move_direction = self.HORIZONTAL
             path.append(next_move)
             current = next_move
-        
-        #debug_write(path)
+
         return path
-  
-    def _choose_next_move(self, current_point, previous_move_direction, end_points):
+
+    def _choose_next_move(self, current_point, previous_move_direction, end_points, pathlength):
         """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
         """
         neighbors = self._get_neighbors(current_point)
-        #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
 
         ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0],current_point[1]].pathlength
+        best_pathlength = pathlength[current_point[0] * self.size + current_point[1]]
         for neighbor in neighbors:
-            #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.sim_map_ref.is_in_bounds(neighbor[0], neighbor[1]) or self.game_map[neighbor[0],neighbor[1]].blocked:
+            x, y = neighbor
+            if not self._is_pathable(x, y):
                 continue
 
             new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x,y].pathlength
+            current_pathlength = pathlength[x * self.size + y]
 
             #Filter by pathlength
             if current_pathlength > best_pathlength:
                 continue
             elif current_pathlength < best_pathlength:
-                #debug_write("Contender has better pathlength at {} vs champs {}".format(current_pathlength, best_pathlength))
                 new_best = True
 
             #Filter by direction based on prev move
@@ -243,7 +282,6 @@ class SimShortestPathFinder:
             ideal_neighbor = neighbor
             best_pathlength = current_pathlength
 
-        #debug_write("Gave unit at {} new tile {}".format(current_point, ideal_neighbor))
         return ideal_neighbor
 
     def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
@@ -1,24 +1,54 @@
-from queue import Queue
 from typing import Literal
-import pygame
 
+from gamelib.geometry import locations_in_range
 from .constants import *
 from .game_configs import configs
 
+class UnitStats:
+    """The stats of one unit type, read from configs once at import"""
+    __slots__ = ("cost", "start_health", "attack_range", "damage_structure", "damage_walker", "speed",
+                 "shield_per_unit", "shield_bonus_per_y", "shield_range")
+
+    def __init__(self, info: dict) -> None:
+        self.cost = info["cost"]
+        self.start_health = info["startHealth"]
+        self.attack_range = info.get("attackRange", 0)
+        self.damage_structure = info.get("attackDamageTower", 0)
+        self.damage_walker = info.get("attackDamageMobile", 0)
+        self.speed = info.get("speed", 0)
+        self.shield_per_unit = info.get("shieldPerUnit", 0)
+        self.shield_bonus_per_y = info.get("shieldBonusPerY", 0)
+        self.shield_range = info.get("shieldRange", 0)
+
+# UnitType -> stats, before and after upgrading
+UNIT_STATS = {UnitType(i): UnitStats(info) for i, info in enumerate(configs["unitInformation"])}
+UPGRADED_UNIT_STATS = {UnitType(i): UnitStats({**info, **info.get("upgrade", {})}) for i, info in enumerate(configs["unitInformation"])}
+
 class SimUnit:
+    __slots__ = ("unit_count", "unit_type", "x", "y", "health", "player_index", "upgraded", "stats",
+                 "cost", "attackRange", "damage_structure", "damage_walker")
+
     def __init__(self, unit_type: UnitType, xy: tuple[int, int], player_index: Literal[0, 1], health: float = None, unit_count = 1) -> None:
+        stats = UNIT_STATS[unit_type]
         self.unit_count = unit_count
         self.unit_type = unit_type
         self.x, self.y = xy
-        self.health = health if health else configs["unitInformation"][unit_type_to_index[unit_type]]["startHealth"]
+        self.health = health if health else stats.start_health
         self.player_index = player_index
         self.upgraded = False
-        self.cost = configs["unitInformation"][unit_type_to_index[UnitType(unit_type)]]["cost"]
-        self.attackRange = configs["unitInformation"][unit_type_to_index[UnitType(unit_type)]].get("attackRange", 0)
-        self.damage_structure = configs["unitInformation"][unit_type_to_index[UnitType(unit_type)]].get("attackDamageTower", 0)
-        self.damage_walker = configs["unitInformation"][unit_type_to_index[UnitType(unit_type)]].get("attackDamageMobile", 0)
-        # self.pending_removal = False
-    
+        self.stats = stats
+        self.cost = stats.cost
+        self.attackRange = stats.attack_range
+        self.damage_structure = stats.damage_structure
+        self.damage_walker = stats.damage_walker
+
+    def copy(self) -> "SimUnit":
+        unit_copy = object.__new__(type(self))
+        for cls in type(self).__mro__[:-1]:
+            for name in cls.__slots__:
+                setattr(unit_copy, name, getattr(self, name))
+        return unit_copy
+
     def inflict_damage(self, damage: float) -> float:
         self.health -= damage
         return self.health
@@ -26,73 +56,88 @@ class SimUnit:
     def upgrade(self):
         self.upgraded = True
         if self.unit_type == UnitType.TURRET:
-            self.attackRange = configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["upgrade"]["attackRange"]
-            self.damage_walker = configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["upgrade"]["attackDamageMobile"]
-
-    def color_by_health(self, color: tuple[int, int, int] = (255,255,255), health: float = None) -> tuple[int, int, int]:
-        scaling_factor = (health or self.health) / configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["startHealth"]
-        scaling_factor = max(0, min(1, scaling_factor))
-        return (int(color[0]*scaling_factor), int(color[1]*scaling_factor), int(color[2]*scaling_factor))
-    
-    def draw_upgraded(self, xy: tuple[int, int], screen: pygame.display):
-        pygame.draw.circle(screen, (255, 255, 0), (12 + xy[0]*25, 50 + 12 + (27-xy[1])*25), 4)
-        pygame.draw.circle(screen, (0, 0, 0), (12 + xy[0]*25, 50 + 12 + (27-xy[1])*25), 4, 1) #outline
+            self.stats = UPGRADED_UNIT_STATS[self.unit_type]
+            self.attackRange = self.stats.attack_range
+            self.damage_walker = self.stats.damage_walker
 
-    def draw(self, screen: pygame.display, font: pygame.font.Font):
-        color = self.color_by_health()
-
-        if self.unit_type == UnitType.WALL:
-            rect = pygame.Rect(0, 0, 10, 10)
-        elif self.unit_type == UnitType.TURRET:
-            rect = pygame.Rect(0, 0, 20, 20)
+class SimSupport(SimUnit):
+    """A support, whose shield coverage is computed when it is placed or upgraded
 
-        rect.center = (12 + self.x*25, 50 + 12 + (27-self.y)*25)
-        pygame.draw.rect(screen, color, rect)
-        if self.upgraded:
-            self.draw_upgraded((self.x, self.y), screen)
+    coverage holds the flat indices (x * 28 + y) of the tiles in shield range, and
+    shield_amount the shield each walker in range gets: shieldPerUnit plus shieldBonusPerY
+    per row the support is from its owner's edge. shield_bit identifies the support in the
+    bitset of shields a walker stack has already been given, see SimGameState.
+    """
+    __slots__ = ("shieldPerUnit", "shieldBonusPerY", "shieldRange", "shield_bit", "coverage", "shield_amount")
 
-class SimSupport(SimUnit):
-    def __init__(self, xy: tuple[int, int], player_index: Literal[0, 1],  health:int = None) -> None:
+    def __init__(self, xy: tuple[int, int], player_index: Literal[0, 1],  health:int = None, shield_bit: int = 0) -> None:
         super().__init__(UnitType.SUPPORT, xy, player_index, health)
-        self.given_shield = set()
-        self.shieldPerUnit = configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["shieldPerUnit"]
-        self.shieldBonusPerY = configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["shieldBonusPerY"]
-        self.shieldRange = configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["shieldRange"]
-    
+        self.shield_bit = shield_bit
+        self.set_shield_stats()
+
+    def set_shield_stats(self):
+        self.shieldPerUnit = self.stats.shield_per_unit
+        self.shieldBonusPerY = self.stats.shield_bonus_per_y
+        self.shieldRange = self.stats.shield_range
+        # hard coded arena size, the same hit radius as SimGameMap.get_locations_in_range
+        rows = self.y if self.player_index == 0 else 27 - self.y
+        self.shield_amount = self.shieldPerUnit + self.shieldBonusPerY * rows
+        self.coverage = tuple(x * 28 + y for x, y in locations_in_range(self.x, self.y, self.shieldRange, 0.01))
+
     def upgrade(self):
-        self.shieldRange = configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["upgrade"]["shieldRange"]
-        self.shieldPerUnit = configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["upgrade"]["shieldPerUnit"]
-        self.shieldBonusPerY = configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["upgrade"]["shieldBonusPerY"]
-    
-    def draw(self, screen: pygame.display):
-        color = self.color_by_health()
-        center = (12 + self.x*25, 50 + 12 + (27-self.y)*25)
-        pygame.draw.circle(screen, color, center, 10)
-        if self.upgraded:
-            self.draw_upgraded((self.x, self.y), screen)
+        self.upgraded = True
+        self.stats = UPGRADED_UNIT_STATS[self.unit_type]
+        self.set_shield_stats()
 
 class SimWalkerStack(SimUnit):
-    def __init__(self, unit_type: UnitType, xy: tuple[int, int], player_index: Literal[0, 1], unit_count) -> None:
-        super().__init__(unit_type, xy, player_index, unit_count)
+    """A stack of mobile units of one type on one tile
+
+    The path is an immutable tuple of steps with a cursor to the next one, so copies
+    share it. The stack takes a step every frames_per_move frames (1 / speed).
+    shields is a bitset of the shield_bit of every support that has shielded the stack.
+    serial orders the stacks sharing a tile, so ties between them don't depend on set order.
+    """
+    __slots__ = ("target_edge", "path", "cursor", "speed", "frames_per_move", "shields", "serial")
+
+    def __init__(self, unit_type: UnitType, xy: tuple[int, int], player_index: Literal[0, 1], unit_count, serial: int = 0) -> None:
+        super().__init__(unit_type, xy, player_index, None, unit_count)
+        self.serial = serial
         self.target_edge = self.get_target_edge()
-        self.health = [configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]]["startHealth"] for _ in range(unit_count)]
-        self.path = Queue()
-        self.speed = configs["unitInformation"][unit_type_to_index[UnitType(self.unit_type)]].get("speed", 0)
+        self.health = [self.stats.start_health] * unit_count
+        self.path = ()
+        self.cursor = 0
+        self.speed = self.stats.speed
+        self.frames_per_move = max(1, round(1 / self.speed)) if self.speed > 0 else 1
+        self.shields = 0
+
+    def copy(self) -> "SimWalkerStack":
+        unit_copy = super().copy()
+        unit_copy.health = list(self.health)
+        return unit_copy
 
     def get_target_edge(self):
-        # if self.target_edge:
-        #     return self.target_edge
-
+        """The edge opposite the quadrant the stack starts in, as in gamelib's GameState.get_target_edge"""
         # hard coded half arena size
-        return MapEdges.TOP_LEFT if self.x >= 14 else MapEdges.TOP_RIGHT        
+        left = self.x < 14
+        if self.y < 14:
+            return MapEdges.TOP_RIGHT if left else MapEdges.TOP_LEFT
+        return MapEdges.BOTTOM_RIGHT if left else MapEdges.BOTTOM_LEFT
 
     def set_path(self, path):
-        self.path.queue.clear()
-        for step in path: 
-            self.path.put(step)
+        self.path = tuple(map(tuple, path or ()))
+        self.cursor = 0
+
+    def moves_on(self, frame: int) -> bool:
+        """True if the stack takes a step on the given frame"""
+        return frame % self.frames_per_move == 0
+
+    def has_next_step(self) -> bool:
+        return self.cursor < len(self.path)
 
     def next_step(self):
-        return tuple(self.path.get())
+        step = self.path[self.cursor]
+        self.cursor += 1
+        return step
     
     def add_to_stack(self):
         self.unit_count += 1
@@ -112,18 +157,3 @@ class SimWalkerStack(SimUnit):
             return self.health.pop()
         
         return self.health[-1]
-    
-    def draw(self, screen: pygame.display, font: pygame.font.Font):
-        color = self.color_by_health((0, 255, 0), self.health[-1])
-        center = (12 + self.x*25, 50 + 12 + (27-self.y)*25)
-        pygame.draw.circle(screen, color, center, 10)
-        
-        text_surface = font.render(str(self.unit_count), True, (0, 0, 0))  # White color text
-        text_rect = text_surface.get_rect(center=center)
-
-        # Blit the text onto the screen
-        screen.blit(text_surface, text_rect)
-
-
-
-    
\ No newline at end of file
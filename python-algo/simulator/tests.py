@@ -0,0 +1,206 @@
+import unittest
+import json
+from gamelib import GameState
+from .game_configs import configs
+from .constants import UnitType
+from .main import Simulator
+from .parallel import ParallelSimulator
+from .result_cache import ResultCache, deployment_hash
+from .sim_game_state import SimGameState
+
+SHORTHANDS = ["FF", "EF", "DF", "PI", "EI", "SI", "RM", "UP"]
+
+def empty_units():
+    return [[] for _ in range(8)]
+
+def gamelib_config():
+    """The simulator's config in the format gamelib reads, with shorthands and gamelib's damage key"""
+    unit_information = []
+    for info, shorthand in zip(configs["unitInformation"] + [{}, {}], SHORTHANDS):
+        info = {**info, "shorthand": shorthand, "attackDamageWalker": info.get("attackDamageMobile", 0)}
+        if "upgrade" in info:
+            info["upgrade"] = {**info["upgrade"], "attackDamageWalker": info["upgrade"].get("attackDamageMobile", 0)}
+        unit_information.append(info)
+    return {**configs, "unitInformation": unit_information}
+
+def canonical(result):
+    """A result with each unit list sorted, since units come out in set order"""
+    return {key: [sorted(units) for units in value] if key.endswith("Units") else value for key, value in result.items()}
+
+class SimulatorTests(unittest.TestCase):
+
+    def make_board(self):
+        p1_units = empty_units()
+        p1_units[0] = [[12, 11, 40.0, ""], [15, 11, 20.0, ""]]
+        p1_units[1] = [[10, 8, 30.0, ""]]
+        p1_units[2] = [[13, 10, 75.0, ""], [16, 10, 60.0, ""]]
+        p1_units[3] = [[13, 12, 12.0, ""], [13, 12, 12.0, ""]]
+        p1_units[4] = [[15, 13, 5.0, ""]]
+        p1_units[7] = [[16, 10, 0, ""]]
+        p2_units = empty_units()
+        p2_units[0] = [[12, 15, 40.0, ""]]
+        p2_units[1] = [[17, 18, 30.0, ""]]
+        p2_units[2] = [[13, 16, 75.0, ""], [14, 17, 50.0, ""]]
+        p2_units[3] = [[14, 14, 12.0, ""]]
+        p2_units[5] = [[12, 16, 40.0, ""]]
+        return {"turnInfo": [1, 1, 0, 0], "p1Stats": [30.0, 10.0, 10.0, 0], "p2Stats": [30.0, 10.0, 10.0, 0],
+                "p1Units": p1_units, "p2Units": p2_units, "events": {}}
+
+    def make_tests(self):
+        tests = []
+        for x in (3, 8, 13):
+            test = {"p1Units": empty_units(), "p2Units": empty_units()}
+            test["p1Units"][3] = [[x, 13 - x, 12.0, ""]] * 4
+            test["p2Units"][4] = [[x, 14 + x, 5.0, ""]] * 2
+            tests.append(test)
+        return tests
+
+    def test_get_target(self):
+        board = self.make_board()
+        game = GameState(gamelib_config(), json.dumps(board))
+        game.suppress_warnings(True)
+        state = SimGameState(board)
+        for attacker in state.get_fighters():
+            unit = next(unit for unit in game.game_map[attacker.x, attacker.y]
+                        if unit.player_index == attacker.player_index and unit.unit_type == SHORTHANDS[attacker.unit_type.value])
+            expected = game.get_target(unit)
+            target = state.get_target(attacker)
+            self.assertEqual(None if expected is None else (expected.x, expected.y), None if target is None else (target.x, target.y),
+                             "Wrong target for {} at {}".format(attacker.unit_type, (attacker.x, attacker.y)))
+
+    def test_fork(self):
+        board = self.make_board()
+        tests = self.make_tests()
+        base = SimGameState(board)
+        before = canonical(base.get_results())
+        branches = [base.fork(test) for test in tests]
+        expected = [canonical(Simulator(board, test).run()) for test in tests]
+        # run the branches interleaved, so any state they share would show up in each other's results
+        while not all(branch.is_round_over() for branch in branches):
+            for branch in branches:
+                branch.run_frame()
+        self.assertEqual(before, canonical(base.get_results()), "Running a branch changed the state it was forked from")
+        for branch, result in zip(branches, expected):
+            self.assertEqual(result, canonical(branch.get_results()), "A branch did not match running its test on its own")
+
+    def test_run_batch(self):
+        board = self.make_board()
+        tests = self.make_tests()
+        expected = [canonical(Simulator(board, test).run()) for test in tests]
+        self.assertEqual(expected, [canonical(result) for result in Simulator(board).run_batch(tests)])
+        simulator = ParallelSimulator(processes=1)
+        self.assertEqual(expected, [canonical(result) for result in simulator.run_batch(board, tests)])
+        self.assertEqual(expected, [canonical(result) for result in simulator.run_batch(json.dumps(board), tests)], "Cached results differ")
+
+    def test_result_cache(self):
+        board = self.make_board()
+        test, other = self.make_tests()[:2]
+        cache = ResultCache()
+        key = ResultCache.key(0, test)
+        cache.put(key, {"p1Stats": [30.0]})
+        self.assertIsNone(cache.get(ResultCache.key(0, other)), "An entry for another test was returned")
+        result = cache.get(key)
+        result["p1Stats"][0] = 0.0
+        self.assertEqual({"p1Stats": [30.0]}, cache.get(key), "Changing a result changed the cache")
+
+        # stacks on one tile whose healths multiply out the same must still hash apart
+        stacked = {"p1Units": empty_units(), "p2Units": empty_units()}
+        stacked["p1Units"][3] = [[13, 0, 12.0, ""]] * 3
+        swapped = {"p1Units": empty_units(), "p2Units": empty_units()}
+        swapped["p1Units"][3] = [[13, 0, 7.0, ""]] * 5
+        self.assertNotEqual(deployment_hash(stacked), deployment_hash(swapped))
+
+        # a simulator's repeated tests each get their own result
+        simulator = ParallelSimulator(processes=1)
+        first, second = simulator.run_batch(board, [test, test])
+        self.assertIsNot(first, second)
+        self.assertNotEqual(canonical(first), canonical(simulator.run_batch(board, [other])[0]))
+
+    def test_turrets_in_range(self):
+        state = SimGameState(self.make_board())
+        game_map = state.game_map
+        for player_index in (0, 1):
+            locations = [(13, 13), (13, 14), (3, 10), (20, 6), (12, 19)]
+            expected = []
+            for turret in sorted(state.get_fighters(), key=lambda unit: (unit.x, unit.y)):
+                if turret.unit_type == UnitType.TURRET and turret.player_index != player_index and any((x - turret.x) ** 2 + (y - turret.y) ** 2 < (turret.attackRange + 0.01) ** 2 for x, y in locations):
+                    expected.append((turret.x, turret.y))
+            self.assertEqual(expected, game_map.get_turrets_in_range(locations, player_index))
+        # [16, 10] is upgraded, so it reaches [16, 14] 4 tiles away
+        self.assertEqual([(16, 10)], game_map.get_turrets_in_range([(16, 14)], 1))
+
+    def test_fork_upgrade(self):
+        board = {"p1Stats": [30.0, 10.0, 10.0, 0], "p2Stats": [30.0, 10.0, 10.0, 0], "p1Units": empty_units(), "p2Units": empty_units()}
+        board["p1Units"][2] = [[13, 10, 75.0, ""]]
+        base = SimGameState(board)
+        # [13, 14] is 4 away, in range of the turret only once upgraded
+        self.assertEqual([], base.get_threat_index()[13 * 28 + 14])
+        test = {"p1Units": empty_units(), "p2Units": empty_units()}
+        test["p1Units"][7] = [[13, 10, 0, ""]]
+        branch = base.fork(test)
+        self.assertEqual([(13, 10)], branch.get_threat_index()[13 * 28 + 14], "The branch kept the threat index from before the upgrade")
+        self.assertEqual([], base.get_threat_index()[13 * 28 + 14], "Upgrading on a branch changed the base's threat index")
+
+    def test_shields(self):
+        board = {"p1Stats": [30.0, 10.0, 10.0, 0], "p2Stats": [30.0, 10.0, 10.0, 0], "p1Units": empty_units(), "p2Units": empty_units()}
+        board["p1Units"][3] = [[13, 0, 12.0, ""]] * 2
+        board["p1Units"][1] = [[13, 2, 30.0, ""], [12, 1, 30.0, ""]]
+        board["p1Units"][7] = [[13, 2, 0, ""]]
+        board["p2Units"][3] = [[14, 27, 12.0, ""]]
+        board["p2Units"][1] = [[14, 25, 30.0, ""]]
+        board["p2Units"][7] = [[14, 25, 0, ""]]
+        state = SimGameState(board)
+        upgraded = state.game_map[13, 2]
+        # upgraded supports add shieldBonusPerY per row from their owner's edge: 5 + 0.3 * 2
+        self.assertAlmostEqual(5.6, upgraded.shield_amount)
+        self.assertAlmostEqual(5.6, state.game_map[14, 25].shield_amount, msg="The second player's rows should count from the top edge")
+        self.assertAlmostEqual(3.0, state.game_map[12, 1].shield_amount)
+        scout = next(walker for walker in state.get_walkers() if walker.player_index == 0)
+        enemy_scout = next(walker for walker in state.get_walkers() if walker.player_index == 1)
+
+        state.run_frame()
+        self.assertEqual([20.6, 20.6], [round(health, 6) for health in scout.health], "Each scout should get both shields")
+        self.assertEqual([17.6], [round(health, 6) for health in enemy_scout.health])
+        for _ in range(2):
+            state.run_frame()
+            self.assertEqual([20.6, 20.6], [round(health, 6) for health in scout.health], "A support shielded a stack twice")
+
+        # as if the upgraded support was destroyed: the rebuilt index must remember the shields already given
+        state.game_map.remove_unit(13, 2, upgraded)
+        state.supports.discard(upgraded)
+        state.all_units.discard(upgraded)
+        state.index_shields()
+        self.assertNotIn(upgraded.shield_bit, state.shield_amounts)
+        state.run_frame()
+        self.assertEqual([20.6, 20.6], [round(health, 6) for health in scout.health], "Rebuilding the index shielded a stack again")
+
+    def test_speed(self):
+        board = {"p1Stats": [30.0, 10.0, 10.0, 0], "p2Stats": [30.0, 10.0, 10.0, 0], "p1Units": empty_units(), "p2Units": empty_units()}
+        board["p1Units"][3] = [[3, 10, 12.0, ""]]
+        board["p1Units"][4] = [[13, 0, 5.0, ""]]
+        state = SimGameState(board)
+        scout, demolisher = sorted(state.get_walkers(), key=lambda walker: walker.unit_type.value)
+        for _ in range(10):
+            scout_location = scout.x, scout.y
+            demolisher_location = demolisher.x, demolisher.y
+            state.run_frame()
+            self.assertNotEqual(scout_location, (scout.x, scout.y), "A scout should move every frame")
+            self.assertEqual(state.frame % 2 == 0, demolisher_location != (demolisher.x, demolisher.y),
+                             "A demolisher should move every other frame, not on frame {}".format(state.frame))
+
+    def test_shared_tile(self):
+        board = {"p1Stats": [30.0, 10.0, 10.0, 0], "p2Stats": [30.0, 10.0, 10.0, 0], "p1Units": empty_units(), "p2Units": empty_units()}
+        board["p1Units"][3] = [[13, 0, 12.0, ""]] * 2
+        board["p1Units"][4] = [[13, 0, 5.0, ""]]
+        board["p2Units"][2] = [[12, 3, 75.0, ""], [14, 3, 75.0, ""]]
+        state = SimGameState(board)
+        self.assertEqual(2, len(state.game_map.walkers[13 * 28]), "Both stacks should be on [13, 0]")
+        self.assertEqual(3, state.game_map.stack_count[13 * 28])
+        scout, demolisher = sorted(state.get_walkers(), key=lambda walker: walker.unit_type.value)
+
+        # both stacks step onto [13, 1], where each turret can hit them
+        state.run_frame()
+        self.assertEqual((13, 1), (scout.x, scout.y))
+        self.assertNotIn(demolisher, state.get_walkers(), "The lowest health stack should have been destroyed by the first turret")
+        self.assertEqual([12.0, 6.0], scout.health, "The second turret should have hit the other stack on the tile")
+        self.assertEqual(2, state.game_map.stack_count[13 * 28 + 1])
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of GameState construction, the first thing every on_turn does.
+
+Usage:
+    python scripts/benchmark_game_state.py [REPLAY_FILE ...]
+
+Uses every replay in replays/ by default. Each replay's config is used to parse
+its own frames. Replays from short games have near-empty boards, so every frame
+is also timed once more with the free tiles filled with random structures from
+both players, to show the cost on a busy board.
+"""
+import json
+import os
+import random
+import sys
+import time
+
+file_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.abspath(os.path.join(file_dir, os.pardir))
+sys.path.insert(0, os.path.join(parent_dir, "python-algo"))
+
+import gamelib
+from gamelib.geometry import ARENA_SIZE, HALF_ARENA, IN_BOUNDS
+
+REPEATS = 20
+
+
+def read_replay(path):
+    """Returns the config and the turn frames of a replay"""
+    config = None
+    frames = []
+    with open(path) as replay:
+        for line in replay:
+            line = line.strip()
+            if not line:
+                continue
+            if config is None:
+                config = json.loads(line)
+            elif json.loads(line)["turnInfo"][0] == 0:
+                frames.append(line)
+    return config, frames
+
+
+def fill_board(frame, seed):
+    """Fills every free tile with a random structure, as a stand in for a late game board"""
+    rng = random.Random(seed)
+    state = json.loads(frame)
+    for i in range(ARENA_SIZE * ARENA_SIZE):
+        if not IN_BOUNDS[i] or rng.random() < 0.4:
+            continue
+        x, y = divmod(i, ARENA_SIZE)
+        units = state["p1Units"] if y < HALF_ARENA else state["p2Units"]
+        units[rng.randrange(3)].append([x, y, 60.0, str(i)])
+    return json.dumps(state)
+
+
+def time_frames(config, frames):
+    gamelib.GameState(config, frames[0])
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for frame in frames:
+            gamelib.GameState(config, frame)
+    return (time.perf_counter() - start) / (REPEATS * len(frames))
+
+
+def main(paths):
+    for path in paths:
+        config, frames = read_replay(path)
+        if not frames:
+            print("{}: no turn frames".format(path))
+            continue
+        busy = [fill_board(frame, i) for i, frame in enumerate(frames)]
+        state = json.loads(busy[0])
+        units = sum(len(units) for units in state["p1Units"] + state["p2Units"])
+        print(os.path.basename(path))
+        print("  {} replay frames:    {:.3f} ms per GameState".format(len(frames), time_frames(config, frames) * 1000))
+        print("  {} busy frames ({} units): {:.3f} ms per GameState".format(len(busy), units, time_frames(config, busy) * 1000))
+
+
+if __name__ == "__main__":
+    replay_dir = os.path.join(parent_dir, "replays")
+    paths = sys.argv[1:] or sorted(os.path.join(replay_dir, name) for name in os.listdir(replay_dir) if name.endswith(".replay"))
+    main(paths)
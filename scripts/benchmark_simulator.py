@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Fidelity and speed benchmark of the simulator against the engine's own replays.
+
+Usage:
+    python scripts/benchmark_simulator.py [REPLAY_FILE ...]
+
+Uses every replay in replays/ by default. For each turn the first action frame,
+which holds the board with that turn's deployments placed, is run through the
+simulator to the end of the round and compared with the last action frame the
+engine sent for the turn. Player health and every unit (position and health) are
+compared, pending removals are not since the simulator does not model them.
+
+Turns with no mobile units on the board are skipped, since there is nothing to
+simulate. Prints the mismatches and the simulated frames per second, and exits
+with status 1 if any turn did not match, so speed work can be checked for
+accuracy. Exits with status 2 if no turn could be simulated at all, rather than
+reporting a pass: record a match with scripts/run_match.py to get a replay with
+action phases.
+
+scripts/fixtures/synthetic.replay is a small hand written replay that exercises
+the whole harness, and scripts/tests.py checks it passes. It checks the script,
+not the simulator's fidelity to the engine, which needs recorded replays.
+"""
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+file_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.abspath(os.path.join(file_dir, os.pardir))
+sys.path.insert(0, os.path.join(parent_dir, "python-algo"))
+
+from simulator import Simulator
+
+REPEATS = 5
+HEALTH_TOLERANCE = 0.01
+# index of the pending removals in a frame's unit lists
+REMOVE_INDEX = 6
+# indices of the mobile unit types in a frame's unit lists
+WALKER_INDICES = (3, 4, 5)
+
+
+def read_turns(path):
+    """Returns the (deploy frame, final frame) of every turn of a replay that has an action phase"""
+    deploy_frames = {}
+    final_frames = {}
+    with open(path) as replay:
+        frames = [json.loads(line) for line in replay if line.strip()]
+    # the config line has no turnInfo
+    for frame in frames:
+        if "turnInfo" not in frame:
+            continue
+        frame_type, turn, action_frame = frame["turnInfo"][:3]
+        if frame_type != 1:
+            continue
+        if action_frame == 0:
+            deploy_frames[turn] = frame
+        final_frames[turn] = frame
+    return [(turn, deploy_frames[turn], final_frames[turn]) for turn in sorted(deploy_frames)]
+
+
+def has_walkers(frame):
+    return any(frame[key][index] for key in ("p1Units", "p2Units") for index in WALKER_INDICES)
+
+
+def unit_mismatches(expected, actual):
+    """Counts the units that are missing, extra, or on the right location with the wrong health"""
+    mismatches = 0
+    for key in ("p1Units", "p2Units"):
+        for unit_type, (expected_units, actual_units) in enumerate(zip(expected[key], actual[key])):
+            if unit_type == REMOVE_INDEX:
+                continue
+            expected_health = defaultdict(list)
+            actual_health = defaultdict(list)
+            for x, y, health, _ in expected_units:
+                expected_health[x, y].append(health)
+            for x, y, health, _ in actual_units:
+                actual_health[x, y].append(health)
+            for location in expected_health.keys() | actual_health.keys():
+                a = sorted(expected_health.get(location, []))
+                b = sorted(actual_health.get(location, []))
+                mismatches += abs(len(a) - len(b))
+                mismatches += sum(1 for h1, h2 in zip(a, b) if abs(h1 - h2) > HEALTH_TOLERANCE)
+    return mismatches
+
+
+def health_mismatch(expected, actual):
+    return any(abs(expected[key][0] - actual[key][0]) > HEALTH_TOLERANCE for key in ("p1Stats", "p2Stats"))
+
+
+def simulate(deploy_frame):
+    """Runs a deploy frame to the end of the round, returning the result and the number of frames run"""
+    simulator = Simulator(deploy_frame)
+    result = simulator.run()
+    return result, simulator.game_state.frame + 1
+
+
+def main(paths):
+    stats = Counter()
+    for path in paths:
+        turns = read_turns(path)
+        print(os.path.basename(path))
+        if not turns:
+            print("  no action phases")
+            continue
+        for turn, deploy_frame, final_frame in turns:
+            if not has_walkers(deploy_frame):
+                stats["skipped"] += 1
+                continue
+            result, frames = simulate(deploy_frame)
+            hp_mismatch = health_mismatch(final_frame, result)
+            units = unit_mismatches(final_frame, result)
+            if hp_mismatch or units:
+                print("  turn {}: health {}, {} unit mismatches".format(turn, "differs" if hp_mismatch else "matches", units))
+
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                simulate(deploy_frame)
+            stats["seconds"] += time.perf_counter() - start
+            stats["frames"] += frames * REPEATS
+            stats["turns"] += 1
+            stats["hp mismatches"] += hp_mismatch
+            stats["unit mismatches"] += units
+            stats["mismatched turns"] += bool(hp_mismatch or units)
+
+    if not stats["turns"] or not stats["frames"]:
+        print("No turn with mobile units to simulate ({} skipped), nothing was checked. "
+              "Record a match with scripts/run_match.py to get a replay with action phases.".format(stats["skipped"]), file=sys.stderr)
+        return 2
+    print("{} turns ({} without mobile units skipped), {} with mismatches: {} health, {} units".format(
+        stats["turns"], stats["skipped"], stats["mismatched turns"], stats["hp mismatches"], stats["unit mismatches"]))
+    print("{:.0f} frames per second ({:.3f} ms per turn)".format(
+        stats["frames"] / stats["seconds"], stats["seconds"] * 1000 / (stats["turns"] * REPEATS)))
+    return 1 if stats["mismatched turns"] else 0
+
+
+if __name__ == "__main__":
+    replay_dir = os.path.join(parent_dir, "replays")
+    paths = sys.argv[1:] or sorted(os.path.join(replay_dir, name) for name in os.listdir(replay_dir) if name.endswith(".replay"))
+    sys.exit(main(paths))
@@ -0,0 +1,57 @@
+import contextlib
+import copy
+import io
+import os
+import tempfile
+import unittest
+
+import benchmark_simulator
+
+FIXTURE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures", "synthetic.replay")
+
+
+class BenchmarkSimulatorTests(unittest.TestCase):
+
+    def test_read_turns(self):
+        turns = benchmark_simulator.read_turns(FIXTURE)
+        self.assertEqual([1, 2], [turn for turn, _, _ in turns])
+        turn, deploy_frame, final_frame = turns[0]
+        self.assertEqual([1, 1, 0, 11], deploy_frame["turnInfo"])
+        self.assertEqual([1, 1, 27, 38], final_frame["turnInfo"])
+        self.assertTrue(benchmark_simulator.has_walkers(deploy_frame))
+        self.assertFalse(benchmark_simulator.has_walkers(turns[1][1]), "Turn 2 only places a wall")
+
+    def test_mismatches(self):
+        _, _, final_frame = benchmark_simulator.read_turns(FIXTURE)[0]
+        self.assertEqual(0, benchmark_simulator.unit_mismatches(final_frame, final_frame))
+        self.assertFalse(benchmark_simulator.health_mismatch(final_frame, final_frame))
+
+        actual = copy.deepcopy(final_frame)
+        actual["p2Stats"][0] -= 1
+        self.assertTrue(benchmark_simulator.health_mismatch(final_frame, actual))
+
+        actual = copy.deepcopy(final_frame)
+        # one unit with the wrong health, one extra, and a pending removal that is ignored
+        actual["p2Units"][2][0][2] -= 10
+        actual["p1Units"][3].append([14, 1, 15.0, ""])
+        actual["p1Units"][benchmark_simulator.REMOVE_INDEX].append([14, 1, 0, ""])
+        self.assertEqual(2, benchmark_simulator.unit_mismatches(final_frame, actual))
+        actual["p2Units"][2][0][2] += 10 - benchmark_simulator.HEALTH_TOLERANCE / 2
+        self.assertEqual(1, benchmark_simulator.unit_mismatches(final_frame, actual), "Health within the tolerance should match")
+
+    def test_main(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertEqual(0, benchmark_simulator.main([FIXTURE]))
+        self.assertIn("1 turns (1 without mobile units skipped), 0 with mismatches", out.getvalue())
+        self.assertIn("frames per second", out.getvalue())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config_only.replay")
+            with open(FIXTURE) as fixture, open(path, "w") as replay:
+                replay.write(fixture.readline())
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(2, benchmark_simulator.main([path]), "A replay without action phases should not pass")
+
+
+if __name__ == "__main__":
+    unittest.main()